@@ -0,0 +1,19 @@
+from django.core.checks import Tags, Warning, register
+
+from .jobs import background_jobs_available
+
+
+@register(Tags.caches)
+def check_background_jobs_cache(app_configs, **kwargs):
+    """Avisa al arrancar si las explicaciones en segundo plano quedan desactivadas."""
+    if background_jobs_available():
+        return []
+    return [
+        Warning(
+            'La caché por defecto es propia de cada proceso: las explicaciones '
+            'con "background": true se rechazarán.',
+            hint='Definir REDIS_URL, o AI_JOBS_ALLOW_LOCAL_CACHE=true si el '
+                 'servidor corre en un único proceso.',
+            id='ai_service.W001',
+        )
+    ]
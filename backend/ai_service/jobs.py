@@ -0,0 +1,74 @@
+"""
+Generación de explicaciones en segundo plano.
+
+La vista encola el trabajo y responde 202 con un `job_id`; el cliente
+consulta el estado hasta que la explicación está lista. Así el hilo de
+la petición no queda bloqueado esperando a Ollama.
+
+El estado se guarda en la caché de Django: con varios procesos
+(gunicorn, etc.) hace falta un backend compartido (REDIS_URL) para que
+cualquier worker pueda responder la consulta. Con una caché propia de cada
+proceso, la consulta que llega a otro proceso daría 404, así que los
+trabajos solo se aceptan si AI_JOBS_ALLOW_LOCAL_CACHE declara que hay un
+único proceso (ver background_jobs_available).
+"""
+
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+
+from reactions.models import Reaction
+from .service import DeepSeekService, REACTION_EXPLANATION_FIELDS, cache_is_shared
+
+logger = logging.getLogger(__name__)
+
+JOB_CACHE_TIMEOUT = 3600  # 1 hora
+JOB_STATUS_PENDING = 'pending'
+JOB_STATUS_DONE = 'done'
+JOB_STATUS_ERROR = 'error'
+
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'AI_JOB_WORKERS', 4),
+    thread_name_prefix='ai-job',
+)
+
+
+def _job_key(job_id):
+    return f'ai:job:{job_id}'
+
+
+def background_jobs_available():
+    """True si cualquier proceso puede consultar el estado de un trabajo."""
+    return cache_is_shared() or getattr(settings, 'AI_JOBS_ALLOW_LOCAL_CACHE', False)
+
+
+def submit_reaction_explanation(reaction_id, level='intermediate'):
+    """Encola la explicación de una reacción y devuelve el id del trabajo."""
+    job_id = uuid.uuid4().hex
+    cache.set(_job_key(job_id), {'status': JOB_STATUS_PENDING}, JOB_CACHE_TIMEOUT)
+    _executor.submit(_run_reaction_explanation, job_id, reaction_id, level)
+    return job_id
+
+
+def get_job(job_id):
+    """Estado del trabajo, o None si no existe o ya expiró."""
+    return cache.get(_job_key(job_id))
+
+
+def _run_reaction_explanation(job_id, reaction_id, level):
+    close_old_connections()
+    try:
+        reaction = Reaction.objects.only(*REACTION_EXPLANATION_FIELDS).get(id=reaction_id)
+        explanation, source = DeepSeekService().explain_reaction(reaction, level)
+        result = {'status': JOB_STATUS_DONE, 'explanation': explanation, 'source': source}
+    except Exception as e:
+        logger.error("Error en trabajo de explicación %s: %s", job_id, e)
+        result = {'status': JOB_STATUS_ERROR, 'error': f'Error al generar explicación: {e}'}
+    finally:
+        # Cada hilo del pool abre su propia conexión a la BD
+        close_old_connections()
+    cache.set(_job_key(job_id), result, JOB_CACHE_TIMEOUT)
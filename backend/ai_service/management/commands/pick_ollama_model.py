@@ -0,0 +1,79 @@
+"""
+Comando para elegir el modelo de Ollama en tiempo de despliegue.
+
+Uso:
+    python manage.py pick_ollama_model
+    python manage.py pick_ollama_model --benchmark
+
+Imprime la línea OLLAMA_MODEL=... para copiar al .env; en tiempo de
+ejecución el servicio usa únicamente ese modelo, sin sondeos.
+"""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ai_service.service import DeepSeekService, AI_SERVICE_ERRORS
+
+
+# Orden de preferencia cuando el modelo configurado no está instalado
+PREFERRED_MODELS = [
+    'llama3.2:latest',
+    'deepseek-r1:7b',
+    'deepseek-r1:1.5b',
+]
+
+
+class Command(BaseCommand):
+    help = 'Elige el modelo de Ollama a usar y muestra la línea OLLAMA_MODEL=...'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--benchmark',
+            action='store_true',
+            help='Mide el arranque en frío de cada modelo candidato',
+        )
+
+    def handle(self, *args, **options):
+        service = DeepSeekService()
+        configured = service.model
+        models = service.get_available_models()
+        if not models:
+            raise CommandError(
+                f'Ollama no responde en {service.base_url} o no tiene modelos instalados'
+            )
+
+        candidates = [m for m in [configured, *PREFERRED_MODELS] if m in models]
+        if not candidates:
+            candidates = models[:1]
+
+        if options['benchmark']:
+            candidates = self._benchmark(service, candidates)
+
+        if candidates[0] != configured:
+            reason = 'no respondió' if configured in models else 'no está instalado'
+            self.stderr.write(
+                self.style.WARNING(f'El modelo configurado {reason}; se usa {candidates[0]}')
+            )
+        self.stdout.write(f'OLLAMA_MODEL={candidates[0]}')
+
+    def _benchmark(self, service, candidates):
+        """Mide cada candidato; devuelve solo los que responden."""
+        working = []
+        # Descargar cada modelo tras medirlo: que no se queden todos residentes
+        service.keep_alive = 0
+        for model in dict.fromkeys(candidates):
+            service.model = model
+            start = time.perf_counter()
+            try:
+                service._call_ollama_once('Hola', max_tokens=1)
+            except AI_SERVICE_ERRORS as e:
+                self.stderr.write(self.style.ERROR(f'{model}: error ({e})'))
+                continue
+            elapsed = time.perf_counter() - start
+            self.stderr.write(f'{model}: {elapsed:.2f}s')
+            working.append(model)
+
+        if not working:
+            raise CommandError('Ningún modelo candidato respondió a la prueba')
+        return working
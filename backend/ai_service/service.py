@@ -3,13 +3,467 @@ Servicio de integración con DeepSeek vía Ollama.
 Genera explicaciones científicas de reacciones químicas.
 """
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 import logging
 import json
+import time
+import random
+import re
+import socket
+import hashlib
+import threading
+from concurrent.futures import Future
+from functools import lru_cache
+from urllib.parse import urlsplit
 from django.conf import settings
+from django.core.cache import cache
+
+from reactions.models import describe_species
 
 logger = logging.getLogger(__name__)
 
+# Las explicaciones generadas se reutilizan durante un día; los fallbacks
+# (IA caída o respuesta vacía) solo un minuto para reintentar pronto.
+EXPLANATION_CACHE_TIMEOUT = 60 * 60 * 24
+FALLBACK_CACHE_TIMEOUT = 60
+
+# Candado en la caché para que, con varios procesos y un backend compartido
+# (Redis, Memcached, BD), solo uno genere cada clave. Con una caché propia de
+# cada proceso no aporta nada sobre el Future en memoria y no se usa.
+# Dura algo más que el timeout de Ollama por si el proceso muere sin liberarlo;
+# quien no lo obtiene espera como mucho GENERATION_WAIT_TIMEOUT y después
+# genera por su cuenta (p. ej. si el candado quedó huérfano).
+GENERATION_LOCK_TIMEOUT = 150
+GENERATION_WAIT_TIMEOUT = 5
+GENERATION_POLL_INTERVAL = 0.5
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Columnas de Reaction que usan los prompts, fallbacks y claves de caché;
+# las vistas cargan solo estas con .only() (sin animation_data, etc.)
+REACTION_EXPLANATION_FIELDS = (
+    'id', 'equation', 'reaction_type', 'reactants', 'products',
+    'enthalpy_change', 'is_exothermic', 'real_world_applications', 'description',
+    'reactants_display', 'products_display',
+)
+
+# Errores de red/IA que las vistas convierten en fallback o 503; el resto
+# (errores de programación) llega al custom_exception_handler.
+# TimeoutError y ConnectionError son subclases de OSError.
+AI_SERVICE_ERRORS = (requests.RequestException, OSError)
+
+# Origen de una explicación; explain_* lo devuelven junto al texto
+SOURCE_CACHE = 'cache'
+SOURCE_AI = 'ai'
+SOURCE_FALLBACK = 'fallback'
+
+# Tokens máximos por nivel de detalle
+ELEMENT_TOKEN_LIMITS = {'basic': 300, 'intermediate': 500, 'advanced': 800}
+REACTION_TOKEN_LIMITS = {'basic': 200, 'intermediate': 350, 'advanced': 500}
+
+# Reintentos ante fallos transitorios (conexión rechazada, 429, 5xx) con
+# backoff exponencial + jitter, y circuit breaker: tras 5 fallos seguidos
+# se deja de llamar a Ollama durante 30 s y se usa el fallback directamente.
+RETRY_ATTEMPTS = 3
+RETRY_BASE_DELAY = 0.2  # segundos
+RETRY_MAX_DELAY = 2.0
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_OPEN_SECONDS = 30
+
+# Validez del sondeo de disponibilidad; una generación correcta dentro de
+# esta ventana también cuenta como "disponible" sin volver a sondear.
+AVAILABILITY_CACHE_SECONDS = 60
+
+# Instrucciones fijas enviadas como `system` a Ollama. Al ser idénticas en
+# cada llamada, Ollama reutiliza su KV-cache y solo procesa la parte variable.
+REACTION_SYSTEM_PROMPT = """Eres un profesor de química experto. Tu tarea es explicar reacciones químicas REALES.
+
+IMPORTANTE:
+- Solo explica lo que REALMENTE ocurre en la reacción indicada
+- No inventes información ni reacciones alternativas
+- Sé preciso y educativo
+- Responde en español"""
+
+ELEMENT_SYSTEM_PROMPT = """Eres un profesor de química experto. Explicas elementos químicos en español.
+
+Incluye:
+1. Propiedades físicas y químicas principales
+2. Dónde se encuentra en la naturaleza
+3. Usos y aplicaciones importantes
+4. Datos curiosos o históricos
+
+Responde SOLO con la explicación, sin introducción ni despedida."""
+
+
+# Plantillas estáticas de los prompts y fallbacks (se construyen una sola vez)
+ELEMENT_LEVEL_INSTRUCTIONS = {
+    'basic': "Explica para un estudiante de secundaria. Usa lenguaje simple. Máximo 150 palabras.",
+    'intermediate': "Explica para un estudiante universitario. Incluye aplicaciones y propiedades importantes. Máximo 250 palabras.",
+    'advanced': "Explica a nivel profesional. Incluye configuración electrónica detallada, propiedades químicas avanzadas y aplicaciones industriales. Máximo 400 palabras."
+}
+
+REACTION_LEVEL_INSTRUCTIONS = {
+    'basic': """
+Explica esta reacción química para un estudiante de secundaria.
+Usa lenguaje simple y ejemplos cotidianos.
+Evita términos técnicos complejos.
+Mínimo 200 palabras, máximo 300 palabras.
+
+Incluye:
+1. Qué sucede paso a paso en la reacción
+2. Por qué ocurre esta reacción
+3. Un ejemplo de la vida cotidiana donde se ve esto
+4. Qué observaríamos si hiciéramos esta reacción
+""",
+    'intermediate': """
+Explica esta reacción química para un estudiante universitario de primer año.
+Mínimo 400 palabras, máximo 500 palabras.
+
+Incluye:
+1. Descripción detallada del mecanismo de reacción
+2. Tipos de enlaces que se rompen y se forman
+3. Análisis de electronegatividad de los elementos involucrados
+4. Explicación energética (por qué es exotérmica o endotérmica)
+5. Condiciones necesarias para que ocurra
+6. Aplicaciones prácticas en la industria o laboratorio
+7. Precauciones de seguridad relevantes
+""",
+    'advanced': """
+Explica esta reacción química con rigor científico avanzado y profesional.
+Mínimo 600 palabras, máximo 800 palabras.
+
+Incluye:
+1. Mecanismo de reacción detallado paso a paso
+2. Teoría de orbitales moleculares involucrados
+3. Análisis termodinámico completo (ΔH, ΔG, ΔS)
+4. Cinética de la reacción y factores que la afectan
+5. Estados de transición y energía de activación
+6. Configuraciones electrónicas de reactivos y productos
+7. Aplicaciones industriales y de investigación
+8. Historia del descubrimiento de esta reacción
+9. Variantes y reacciones relacionadas
+10. Impacto ambiental o tecnológico si es relevante
+"""
+}
+
+# Parte variable de los prompts; se rellenan con str.format_map
+ELEMENT_PROMPT_TEMPLATE = """Explica el siguiente elemento químico:
+
+Elemento: {name} ({symbol})
+Número atómico: {atomic_number}
+Masa atómica: {atomic_mass} u
+Categoría: {category}
+Configuración electrónica: {electron_config}
+Electrones de valencia: {valence_electrons}
+Electronegatividad: {electronegativity}
+Período: {period}, Grupo: {group}
+
+{instructions}"""
+
+REACTION_PROMPT_TEMPLATE = """
+REACCIÓN: {equation}
+TIPO: {reaction_type}
+REACTIVOS: {reactants}
+PRODUCTOS: {products}
+CAMBIO DE ENTALPÍA: {enthalpy_change} kJ/mol
+REACCIÓN {energy}
+
+
+INSTRUCCIONES:
+{instructions}
+
+Tu explicación:"""
+
+# Explicaciones en lote: varias reacciones en un único prompt con salida JSON
+BULK_GROUP_SIZE = 4
+
+REACTION_BULK_ITEM_TEMPLATE = """{index}) REACCIÓN: {equation}
+   TIPO: {reaction_type}
+   REACTIVOS: {reactants}
+   PRODUCTOS: {products}
+   CAMBIO DE ENTALPÍA: {enthalpy_change} kJ/mol ({energy})"""
+
+REACTION_BULK_PROMPT_TEMPLATE = """Explica cada una de las siguientes reacciones por separado.
+
+{items}
+
+INSTRUCCIONES PARA CADA REACCIÓN:
+{instructions}
+
+Responde SOLO con JSON: {{"explicaciones": [{{"id": <número>, "explicacion": "<texto>"}}]}}"""
+
+CATEGORY_NAMES = {
+    'alkali-metal': 'metal alcalino',
+    'alkaline-earth': 'metal alcalinotérreo',
+    'transition-metal': 'metal de transición',
+    'post-transition-metal': 'metal post-transición',
+    'metalloid': 'metaloide',
+    'nonmetal': 'no metal',
+    'halogen': 'halógeno',
+    'noble-gas': 'gas noble',
+    'lanthanide': 'lantánido',
+    'actinide': 'actínido'
+}
+
+# Patrones de limpieza de respuestas (compilados una sola vez). Cada uno
+# recorre la respuesta en una sola pasada:
+# - bloques de "pensamiento": <think> (DeepSeek-R1), [THINKING], **Pensando**:
+# - prefijos que el modelo podría agregar
+# - 3+ saltos de línea (grupo 1) o 2+ espacios (grupo 2)
+THINKING_RE = re.compile(
+    r'<think>.*?</think>'
+    r'|(?i:\[THINKING\].*?\[/THINKING\])'
+    r'|\*\*Pensando\*\*:.*?(?=\n\n|\Z)',
+    re.DOTALL
+)
+RESPONSE_PREFIXES = ('Explicación:', 'Tu explicación:', 'Respuesta:')
+PREFIX_RE = re.compile(
+    r'^(' + '|'.join(map(re.escape, RESPONSE_PREFIXES)) + r')\s*', re.IGNORECASE
+)
+WHITESPACE_RE = re.compile(r'(\n{3,})|( {2,})')
+
+# Apertura -> cierre (en minúsculas) de los bloques de THINKING_RE, para
+# descartarlos del streaming antes de emitir tokens (ver _clean_stream)
+THINKING_DELIMITERS = {
+    '<think>': '</think>',
+    '[thinking]': '[/thinking]',
+    '**pensando**:': '\n\n',
+}
+STREAM_LEADING_MARKERS = tuple(THINKING_DELIMITERS) + tuple(p.lower() for p in RESPONSE_PREFIXES)
+
+
+def _normalize_whitespace(match):
+    return '\n\n' if match.group(1) else ' '
+
+
+def _retry_delay(attempt):
+    """Espera antes del reintento `attempt` (0, 1, ...) con jitter."""
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    return delay * random.uniform(0.5, 1.5)
+
+
+def _is_transient_error(exc):
+    """True si vale la pena reintentar: sin conexión, 429 o error 5xx."""
+    if isinstance(exc, requests.ConnectionError):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        status_code = exc.response.status_code
+        return status_code == 429 or status_code >= 500
+    return False
+
+
+def _traceback_wanted(exc, expected=AI_SERVICE_ERRORS):
+    """
+    exc_info para el log de un error de IA: los fallos de red esperados
+    (`expected`) se registran sin traza salvo con DEBUG; cualquier otra
+    excepción es un error de programación y conserva la traza completa.
+    """
+    return not isinstance(exc, expected) or logger.isEnabledFor(logging.DEBUG)
+
+
+def _is_outage_error(exc):
+    """
+    True si el fallo indica que Ollama está caído o saturado: timeout, sin
+    conexión o error 5xx. Solo estos cuentan para el circuit breaker; un
+    4xx (modelo inexistente, petición mal formada) no se arregla dejando
+    de llamar.
+    """
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout,
+                        TimeoutError, ConnectionError)):
+        return True
+    if isinstance(exc, requests.HTTPError) and exc.response is not None:
+        return exc.response.status_code >= 500
+    return False
+
+
+def _clean_stream(tokens):
+    """
+    Reemite `tokens` sin los bloques de pensamiento ni el prefijo iniciales.
+
+    Retiene los primeros tokens hasta saber si la respuesta empieza por
+    <think>, [THINKING], **Pensando**: o "Explicación:"; descartado eso,
+    el resto se emite tal cual (la limpieza completa es clean_response).
+    """
+    tokens = iter(tokens)
+    buffer = ''
+    for token in tokens:
+        buffer += token
+        head = buffer.lstrip()
+        lowered = head.lower()
+
+        # Aún puede ser el comienzo de un bloque o de un prefijo
+        if not head or any(m.startswith(lowered) and m != lowered for m in STREAM_LEADING_MARKERS):
+            continue
+
+        opener = next((o for o in THINKING_DELIMITERS if lowered.startswith(o)), None)
+        if opener is not None:
+            end = lowered.find(THINKING_DELIMITERS[opener], len(opener))
+            if end == -1:
+                continue  # Bloque sin cerrar todavía
+            buffer = head[end + len(THINKING_DELIMITERS[opener]):]
+            continue
+
+        text = PREFIX_RE.sub('', head, count=1)
+        if text:
+            yield text
+            break
+        buffer = ''
+    else:
+        # El stream terminó antes de resolver el comienzo
+        if buffer.strip():
+            yield DeepSeekService.clean_response(buffer)
+        return
+
+    yield from tokens
+
+
+def cache_is_shared():
+    """True si la caché por defecto la comparten todos los procesos."""
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_CACHE_BACKENDS
+
+
+def _cached_result(entry):
+    """(explicación, origen) de una entrada (texto, generado_por_ia) de la caché."""
+    explanation, from_ai = entry
+    return explanation, SOURCE_CACHE if from_ai else SOURCE_FALLBACK
+
+
+def _shared_source(source):
+    """Origen para quien reutiliza la generación de otro: un fallback sigue siéndolo."""
+    return SOURCE_CACHE if source == SOURCE_AI else source
+
+
+@lru_cache(maxsize=1024)
+def _render_reaction_fallback(type_display, reactants, products, is_exothermic,
+                              enthalpy_change, applications, level):
+    """
+    Plantilla de respaldo de una reacción a partir de valores primitivos.
+
+    Es determinista, así que se memoiza: la misma reacción y nivel se
+    renderizan una sola vez por proceso.
+    """
+    basic = f"""
+Esta es una reacción de {type_display.lower()}.
+En ella, {reactants} se combinan para formar {products}.
+{'Esta reacción libera energía (exotérmica).' if is_exothermic else 'Esta reacción absorbe energía (endotérmica).'}
+"""
+    
+    if level == 'basic':
+        return basic.strip()
+    
+    intermediate = basic + f"""
+El cambio de entalpía es de {enthalpy_change or 'un valor no especificado'} kJ/mol.
+"""
+    
+    if level == 'intermediate':
+        return intermediate.strip()
+    
+    # Advanced incluye aplicaciones
+    apps_text = f"\n\nAplicaciones: {', '.join(applications)}" if applications else ""
+    
+    return (intermediate + apps_text).strip()
+
+
+def _reaction_prompt_fields(reaction):
+    """Valores de una reacción que usan sus prompts (individual y en lote)."""
+    return {
+        'equation': reaction.equation,
+        'reaction_type': reaction.get_reaction_type_display(),
+        'reactants': ', '.join([r.get('symbol', r.get('formula', '')) for r in reaction.reactants]),
+        'products': ', '.join([p.get('formula', p.get('name', '')) for p in reaction.products]),
+        'enthalpy_change': reaction.enthalpy_change or 'No especificado',
+        'energy': 'EXOTÉRMICA' if reaction.is_exothermic else 'ENDOTÉRMICA',
+    }
+
+
+def _element_fields(element):
+    """Valores de un elemento que usan su prompt y su explicación de respaldo."""
+    return {
+        'name': element.name,
+        'symbol': element.symbol,
+        'category': element.category,
+        'atomic_number': element.atomic_number,
+        'atomic_mass': element.atomic_mass,
+        'electron_config': element.electron_config,
+        'valence_electrons': element.valence_electrons,
+        'electronegativity': element.electronegativity,
+        'period': element.period,
+        'group': element.group,
+    }
+
+
+# Los prompts y el respaldo de elementos se memoizan por sus valores
+# primitivos, igual que _render_reaction_fallback: una fila editada (por
+# save(), update(), loaddata u otro proceso) da otra clave, así que no hay
+# nada que invalidar ni instancias de modelo retenidas.
+@lru_cache(maxsize=512)
+def _render_reaction_prompt(equation, reaction_type, reactants, products,
+                            enthalpy_change, energy, level):
+    """Parte variable del prompt de una reacción (ver REACTION_SYSTEM_PROMPT)."""
+    return REACTION_PROMPT_TEMPLATE.format_map({
+        'equation': equation,
+        'reaction_type': reaction_type,
+        'reactants': reactants,
+        'products': products,
+        'enthalpy_change': enthalpy_change,
+        'energy': energy,
+        'instructions': REACTION_LEVEL_INSTRUCTIONS.get(level, REACTION_LEVEL_INSTRUCTIONS['intermediate']),
+    })
+
+
+@lru_cache(maxsize=512)
+def _render_element_prompt(name, symbol, category, atomic_number, atomic_mass,
+                           electron_config, valence_electrons, electronegativity,
+                           period, group, level):
+    """Parte variable del prompt de un elemento (ver ELEMENT_SYSTEM_PROMPT)."""
+    return ELEMENT_PROMPT_TEMPLATE.format_map({
+        'name': name,
+        'symbol': symbol,
+        'atomic_number': atomic_number,
+        'atomic_mass': atomic_mass,
+        'category': category,
+        'electron_config': electron_config,
+        'valence_electrons': valence_electrons,
+        'electronegativity': electronegativity or 'N/A',
+        'period': period,
+        'group': group,
+        'instructions': ELEMENT_LEVEL_INSTRUCTIONS.get(level, ELEMENT_LEVEL_INSTRUCTIONS['intermediate']),
+    })
+
+
+@lru_cache(maxsize=512)
+def _render_element_fallback(name, symbol, category, atomic_number, atomic_mass,
+                             electron_config, valence_electrons, electronegativity,
+                             period, group, melting_point, boiling_point):
+    """Explicación básica de un elemento cuando la IA no está disponible."""
+    category_name = CATEGORY_NAMES.get(category, category)
+
+    return f"""{name} ({symbol}) es un elemento químico clasificado como {category_name}.
+
+**Propiedades básicas:**
+• Número atómico: {atomic_number}
+• Masa atómica: {atomic_mass:.4f} u
+• Configuración electrónica: {electron_config}
+• Electrones de valencia: {valence_electrons}
+
+**Ubicación en la tabla periódica:**
+Se encuentra en el período {period} y grupo {group}.
+
+**Propiedades físicas:**
+• Electronegatividad: {electronegativity or 'No disponible'}
+• Punto de fusión: {melting_point or 'No disponible'} °C
+• Punto de ebullición: {boiling_point or 'No disponible'} °C
+
+Este elemento tiene {atomic_number} protones en su núcleo y típicamente {atomic_number} electrones en su configuración neutra."""
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Ollama no se consulta mientras el circuit breaker esté abierto."""
+
 
 class DeepSeekService:
     """
@@ -22,392 +476,674 @@ class DeepSeekService:
     # Cache para evitar verificar disponibilidad en cada llamada
     _availability_cache = None
     _availability_cache_time = None
+    _last_success_ts = 0.0  # time.monotonic() de la última llamada correcta
+    _warmed_up = False
+    _probe_lock = threading.Lock()
+    
+    # Generaciones en curso por clave de cache (single-flight)
+    _inflight = {}
+    _inflight_lock = threading.Lock()
+    
+    # Opciones de generación comunes a todas las llamadas (num_predict y
+    # num_ctx se calculan por petición)
+    _BASE_OPTIONS = {
+        "temperature": 0.7,  # Balance entre creatividad y coherencia
+        "top_p": 0.9,
+    }
+    
+    # Estado del circuit breaker (compartido por todas las instancias y
+    # modificado desde hilos de petición y del pool de trabajos)
+    _failure_count = 0
+    _circuit_open_until = 0.0
+    _circuit_lock = threading.Lock()
+    
+    # Sesión HTTP compartida: reutiliza conexiones keep-alive con Ollama
+    _session = None
+    _session_lock = threading.Lock()
     
     def __init__(self):
         self.base_url = getattr(settings, 'OLLAMA_BASE_URL', 'http://localhost:11434')
         # Usar llama3.2 como modelo por defecto
         self.model = getattr(settings, 'OLLAMA_MODEL', 'llama3.2:latest')
         self.timeout = 120  # Timeout razonable para respuestas
+        # Contexto reducido para mayor velocidad; solo crece si el prompt no cabe
+        self.num_ctx = getattr(settings, 'OLLAMA_NUM_CTX', 2048)
+        self.num_ctx_cap = getattr(settings, 'OLLAMA_NUM_CTX_CAP', 8192)
+        # -1: el modelo queda residente en Ollama; 0: se descarga tras responder
+        self.keep_alive = -1
+        self.session = self._get_session()
+    
+    @classmethod
+    def _get_session(cls):
+        """Crea (una sola vez por proceso) la sesión con pool de conexiones."""
+        if cls._session is None:
+            with cls._session_lock:
+                if cls._session is None:
+                    session = requests.Session()
+                    # Ollama suele ser local: comprimir solo añade CPU
+                    session.headers['Accept-Encoding'] = 'identity'
+                    # Los reintentos los gestiona _call_ollama (con circuit breaker)
+                    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    cls._session = session
+        return cls._session
     
     def is_available(self, use_cache=True):
-        """Verifica si Ollama está disponible (con cache de 60 segundos)."""
-        import time
+        """
+        Verifica si Ollama está disponible (con cache de AVAILABILITY_CACHE_SECONDS).
         
-        # Usar cache si está disponible y no ha expirado (60 segundos)
-        if use_cache and DeepSeekService._availability_cache is not None:
-            if time.time() - DeepSeekService._availability_cache_time < 60:
+        Solo un hilo sondea cuando la cache expira; los demás esperan el
+        lock y reutilizan el resultado en vez de repetir la petición. Si
+        una generación terminó bien hace poco, no se sondea.
+        """
+        if self._circuit_open():
+            return False
+        
+        if use_cache and time.monotonic() - DeepSeekService._last_success_ts < AVAILABILITY_CACHE_SECONDS:
+            return True
+        
+        if use_cache:
+            cached = self._cached_availability()
+            if cached is not None:
+                return cached
+        
+        with DeepSeekService._probe_lock:
+            # Otro hilo pudo haber sondeado mientras esperábamos el lock
+            if use_cache:
+                cached = self._cached_availability()
+                if cached is not None:
+                    return cached
+            return self._probe_availability()
+    
+    def _circuit_open(self):
+        """True mientras el circuito esté abierto tras fallos consecutivos."""
+        return time.monotonic() < DeepSeekService._circuit_open_until
+    
+    def _record_success(self):
+        with DeepSeekService._circuit_lock:
+            DeepSeekService._failure_count = 0
+            DeepSeekService._last_success_ts = time.monotonic()
+    
+    def _record_failure(self, exc):
+        """Cuenta un fallo de `exc` si indica caída (ver _is_outage_error)."""
+        if not _is_outage_error(exc):
+            return
+        with DeepSeekService._circuit_lock:
+            DeepSeekService._failure_count += 1
+            if DeepSeekService._failure_count < CIRCUIT_FAILURE_THRESHOLD:
+                return
+            failures = DeepSeekService._failure_count
+            DeepSeekService._circuit_open_until = time.monotonic() + CIRCUIT_OPEN_SECONDS
+            DeepSeekService._failure_count = 0
+        logger.error(
+            "Ollama falló %d veces seguidas; circuito abierto durante %ds",
+            failures, CIRCUIT_OPEN_SECONDS
+        )
+    
+    def _cached_availability(self):
+        """Resultado cacheado si no ha expirado, o None."""
+        if DeepSeekService._availability_cache is not None:
+            if time.monotonic() - DeepSeekService._availability_cache_time < AVAILABILITY_CACHE_SECONDS:
                 return DeepSeekService._availability_cache
+        return None
+    
+    def _probe_availability(self):
+        """
+        Comprueba que el puerto de Ollama acepta conexiones TCP y guarda el
+        resultado en la cache de clase.
+
+        Basta con conectar: descargar y parsear /api/tags solo para saber si
+        el servidor está arriba es innecesario (ver get_available_models).
+        Los errores a nivel HTTP se detectan en la llamada real.
+        """
+        url = urlsplit(self.base_url)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        try:
+            with socket.create_connection((url.hostname, port), timeout=0.5):
+                pass
+            available = True
+        except OSError as e:
+            logger.error("Ollama no disponible: %s", e)
+            available = False
+        
+        if available and not DeepSeekService._warmed_up:
+            DeepSeekService._warmed_up = True
+            threading.Thread(target=self.warm_up, daemon=True).start()
         
+        # Guardar en cache
+        DeepSeekService._availability_cache = available
+        DeepSeekService._availability_cache_time = time.monotonic()
+        return available
+    
+    def warm_up(self):
+        """
+        Carga el modelo en Ollama sin generar tokens (prompt vacío) y lo
+        mantiene residente para que la primera explicación no pague la carga.
+        """
+        # Mismo num_ctx que las peticiones normales: si difiere, Ollama recarga el modelo
+        payload = {
+            "model": self.model,
+            "prompt": "",
+            "keep_alive": self.keep_alive,
+            "options": {"num_ctx": self.num_ctx},
+        }
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=3)
-            available = response.status_code == 200
-            if available:
-                models = response.json().get('models', [])
-                logger.info(f"Ollama disponible. Modelos: {[m.get('name') for m in models]}")
-            
-            # Guardar en cache
-            DeepSeekService._availability_cache = available
-            DeepSeekService._availability_cache_time = time.time()
-            return available
+            self.session.post(f"{self.base_url}/api/generate", json=payload, timeout=self.timeout)
+            logger.info("Modelo %s precargado en Ollama", self.model)
         except requests.RequestException as e:
-            logger.error(f"Ollama no disponible: {e}")
-            DeepSeekService._availability_cache = False
-            DeepSeekService._availability_cache_time = time.time()
-            return False
+            logger.warning("No se pudo precargar el modelo: %s", e)
     
     def get_available_models(self):
         """Obtiene lista de modelos disponibles en Ollama."""
         try:
-            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            response = self.session.get(f"{self.base_url}/api/tags", timeout=5)
             if response.status_code == 200:
                 return [m.get('name') for m in response.json().get('models', [])]
             return []
         except requests.RequestException:
             return []
     
+    def _cache_key(self, subject, context):
+        """Clave determinista: sha256(sujeto | contexto | modelo)."""
+        raw = f"{subject}|{json.dumps(context, sort_keys=True)}|{self.model}"
+        return 'ai:explanation:v2:' + hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _get_cached(self, key, generate):
+        """
+        Devuelve (explicación, origen), cacheada o generada con `generate`.
+
+        `generate` retorna (texto, generado_por_ia). En la caché se guarda
+        el par (texto, generado_por_ia): los fallbacks se cachean brevemente
+        para no martillear a Ollama durante una caída y siguen informándose
+        como SOURCE_FALLBACK al reutilizarse.
+        Si otra petición ya está generando la misma clave, se espera su
+        resultado en lugar de lanzar una segunda generación: dentro del
+        proceso con un Future y entre procesos con un candado en la caché
+        (solo si es compartida).
+        """
+        entry = cache.get(key)
+        if entry is not None:
+            return _cached_result(entry)
+
+        with DeepSeekService._inflight_lock:
+            future = DeepSeekService._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                DeepSeekService._inflight[key] = future
+
+        if not is_leader:
+            explanation, source = future.result()
+            return explanation, _shared_source(source)
+
+        lock_key = f'{key}:lock'
+        owns_lock = False
+        try:
+            if cache_is_shared():
+                owns_lock = cache.add(lock_key, 1, GENERATION_LOCK_TIMEOUT)
+                if not owns_lock:
+                    entry = self._wait_for_generation(key, lock_key)
+                    if entry is not None:
+                        result = _cached_result(entry)
+                        future.set_result(result)
+                        return result
+
+            explanation, from_ai = generate()
+            timeout = EXPLANATION_CACHE_TIMEOUT if from_ai else FALLBACK_CACHE_TIMEOUT
+            cache.set(key, (explanation, from_ai), timeout)
+            result = (explanation, SOURCE_AI if from_ai else SOURCE_FALLBACK)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            if owns_lock:
+                cache.delete(lock_key)
+            with DeepSeekService._inflight_lock:
+                DeepSeekService._inflight.pop(key, None)
+
+    def _wait_for_generation(self, key, lock_key):
+        """
+        Espera a que otro proceso termine de generar `key`. Devuelve la
+        entrada cacheada, o None si el candado desaparece sin ella o pasan
+        GENERATION_WAIT_TIMEOUT segundos.
+        """
+        deadline = time.monotonic() + GENERATION_WAIT_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(GENERATION_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+            if cache.get(lock_key) is None:
+                # El generador guarda el resultado antes de soltar el candado
+                return cache.get(key)
+        return None
+
     def explain_element(self, element, level='intermediate'):
         """
         Genera explicación científica detallada de un elemento químico.
-        
+
         Args:
             element: Objeto Element de la base de datos
             level: 'basic', 'intermediate', o 'advanced'
-        
+
         Returns:
-            str: Explicación generada por el modelo de IA
+            tuple: (explicación, origen) con origen SOURCE_CACHE, SOURCE_AI
+            o SOURCE_FALLBACK
         """
+        key = self._cache_key(element.symbol, {'kind': 'element', 'level': level})
+        return self._get_cached(
+            key, lambda: self._generate_element_explanation(element, level)
+        )
+
+    def _generate_element_explanation(self, element, level):
+        """Llama a Ollama para un elemento. Retorna (texto, generado_por_ia)."""
         prompt = self._build_element_prompt(element, level)
-        
+
         try:
             if not self.is_available():
                 logger.warning("Ollama no disponible para explicación de elemento")
-                return self._get_fallback_element_explanation(element, level)
-            
+                return self._get_fallback_element_explanation(element, level), False
+
             # Tokens adaptativos por nivel
-            token_limits = {'basic': 300, 'intermediate': 500, 'advanced': 800}
-            max_tokens = token_limits.get(level, 500)
-            
-            response = self._call_ollama(prompt, max_tokens=max_tokens)
-            cleaned = self._clean_response(response)
-            
+            max_tokens = ELEMENT_TOKEN_LIMITS.get(level, 500)
+
+            response = self._call_ollama(prompt, max_tokens=max_tokens, system=ELEMENT_SYSTEM_PROMPT)
+            cleaned = self.clean_response(response)
+
             if not cleaned or len(cleaned.strip()) < 20:
-                logger.warning(f"Respuesta vacía para elemento: {element.symbol}")
-                return self._get_fallback_element_explanation(element, level)
-            
-            return cleaned
-            
+                logger.warning("Respuesta vacía para elemento: %s", element.symbol)
+                return self._get_fallback_element_explanation(element, level), False
+
+            return cleaned, True
+
         except Exception as e:
-            logger.error(f"Error explicando elemento {element.symbol}: {e}")
-            return self._get_fallback_element_explanation(element, level)
+            logger.error(
+                "Error explicando elemento %s: %s", element.symbol, e, exc_info=_traceback_wanted(e)
+            )
+            return self._get_fallback_element_explanation(element, level), False
     
     def _build_element_prompt(self, element, level):
-        """Construye prompt para explicar un elemento."""
-        
-        level_instructions = {
-            'basic': "Explica para un estudiante de secundaria. Usa lenguaje simple. Máximo 150 palabras.",
-            'intermediate': "Explica para un estudiante universitario. Incluye aplicaciones y propiedades importantes. Máximo 250 palabras.",
-            'advanced': "Explica a nivel profesional. Incluye configuración electrónica detallada, propiedades químicas avanzadas y aplicaciones industriales. Máximo 400 palabras."
-        }
-        
-        return f"""Eres un profesor de química experto. Explica el siguiente elemento químico en español:
+        """Construye la parte variable del prompt (ver ELEMENT_SYSTEM_PROMPT)."""
+        return _render_element_prompt(level=level, **_element_fields(element))
 
-Elemento: {element.name} ({element.symbol})
-Número atómico: {element.atomic_number}
-Masa atómica: {element.atomic_mass} u
-Categoría: {element.category}
-Configuración electrónica: {element.electron_config}
-Electrones de valencia: {element.valence_electrons}
-Electronegatividad: {element.electronegativity or 'N/A'}
-Período: {element.period}, Grupo: {element.group}
+    def _get_fallback_element_explanation(self, element, level):
+        """Genera explicación básica cuando la IA no está disponible."""
+        return _render_element_fallback(
+            melting_point=element.melting_point,
+            boiling_point=element.boiling_point,
+            **_element_fields(element),
+        )
 
-{level_instructions.get(level, level_instructions['intermediate'])}
+    def explain_reaction(self, reaction, level='intermediate'):
+        """
+        Genera explicación científica de una reacción química.
 
-Incluye:
-1. Propiedades físicas y químicas principales
-2. Dónde se encuentra en la naturaleza
-3. Usos y aplicaciones importantes
-4. Datos curiosos o históricos
+        Args:
+            reaction: Objeto Reaction de la base de datos
+            level: 'basic', 'intermediate', o 'advanced'
 
-Responde SOLO con la explicación, sin introducción ni despedida."""
-    
-    def _get_fallback_element_explanation(self, element, level):
-        """Genera explicación básica cuando la IA no está disponible."""
-        
-        category_names = {
-            'alkali-metal': 'metal alcalino',
-            'alkaline-earth': 'metal alcalinotérreo',
-            'transition-metal': 'metal de transición',
-            'post-transition-metal': 'metal post-transición',
-            'metalloid': 'metaloide',
-            'nonmetal': 'no metal',
-            'halogen': 'halógeno',
-            'noble-gas': 'gas noble',
-            'lanthanide': 'lantánido',
-            'actinide': 'actínido'
+        Returns:
+            tuple: (explicación, origen) con origen SOURCE_CACHE, SOURCE_AI
+            o SOURCE_FALLBACK
+        """
+        key = self._reaction_cache_key(reaction, level)
+        return self._get_cached(
+            key, lambda: self._generate_reaction_explanation(reaction, level)
+        )
+
+    def _reaction_cache_key(self, reaction, level):
+        context = {
+            'kind': 'reaction',
+            'level': level,
+            'reaction_type': reaction.reaction_type,
+            'enthalpy_change': reaction.enthalpy_change,
         }
-        
-        category_name = category_names.get(element.category, element.category)
-        
-        return f"""{element.name} ({element.symbol}) es un elemento químico clasificado como {category_name}.
+        return self._cache_key(reaction.equation, context)
 
-**Propiedades básicas:**
-• Número atómico: {element.atomic_number}
-• Masa atómica: {element.atomic_mass:.4f} u
-• Configuración electrónica: {element.electron_config}
-• Electrones de valencia: {element.valence_electrons}
+    def explain_reactions_bulk(self, reactions, level='intermediate', group_size=BULK_GROUP_SIZE):
+        """
+        Explica varias reacciones agrupándolas de `group_size` en `group_size`
+        en un solo prompt (Ollama responde un JSON con una explicación por id).
 
-**Ubicación en la tabla periódica:**
-Se encuentra en el período {element.period} y grupo {element.group}.
+        Las reacciones ya cacheadas no se envían; si un grupo falla o falta
+        alguna explicación en la respuesta, esa reacción usa el fallback.
+        Estas explicaciones (más cortas, en JSON) se cachean aparte de las de
+        explain_reaction, que nunca las devuelve (ver _bulk_cache_key).
 
-**Propiedades físicas:**
-• Electronegatividad: {element.electronegativity or 'No disponible'}
-• Punto de fusión: {element.melting_point or 'No disponible'} °C
-• Punto de ebullición: {element.boiling_point or 'No disponible'} °C
+        Returns:
+            list: Explicaciones en el mismo orden que `reactions`
+        """
+        reactions = list(reactions)
+        keys = [self._bulk_cache_key(r, level) for r in reactions]
+        explanations = {key: text for key, (text, _) in cache.get_many(keys).items()}
+        pending = [(r, k) for r, k in zip(reactions, keys) if k not in explanations]
 
-Este elemento tiene {element.atomic_number} protones en su núcleo y típicamente {element.atomic_number} electrones en su configuración neutra."""
+        if pending and not self.is_available():
+            logger.warning("Ollama no está disponible, usando fallback")
+            for reaction, key in pending:
+                explanations[key] = self._get_fallback_explanation(reaction, level)
+            pending = []
 
-    def explain_reaction(self, reaction, level='intermediate'):
+        max_tokens = REACTION_TOKEN_LIMITS.get(level, 350)
+        for start in range(0, len(pending), group_size):
+            group = pending[start:start + group_size]
+            texts = self._generate_bulk_group([r for r, _ in group], level, max_tokens)
+            fresh = {}
+            for (reaction, key), text in zip(group, texts):
+                explanation, from_ai = self._reaction_result(reaction, level, text)
+                explanations[key] = explanation
+                if from_ai:
+                    fresh[key] = (explanation, True)
+            cache.set_many(fresh, EXPLANATION_CACHE_TIMEOUT)
+
+        return [explanations[k] for k in keys]
+
+    def _bulk_cache_key(self, reaction, level):
+        """Clave de las explicaciones en lote: propia, para no mezclarlas con las individuales."""
+        return f'{self._reaction_cache_key(reaction, level)}:bulk'
+
+    def _generate_bulk_group(self, reactions, level, max_tokens):
+        """Una llamada a Ollama para el grupo; devuelve un texto por reacción ('' si falta)."""
+        items = '\n\n'.join(
+            REACTION_BULK_ITEM_TEMPLATE.format_map({'index': i, **_reaction_prompt_fields(r)})
+            for i, r in enumerate(reactions, 1)
+        )
+        prompt = REACTION_BULK_PROMPT_TEMPLATE.format_map({
+            'items': items,
+            'instructions': REACTION_LEVEL_INSTRUCTIONS.get(level, REACTION_LEVEL_INSTRUCTIONS['intermediate']),
+        })
+
+        try:
+            response = self._call_ollama(
+                prompt,
+                max_tokens=max_tokens * len(reactions),
+                system=REACTION_SYSTEM_PROMPT,
+                format='json',
+            )
+            entries = orjson.loads(response).get('explicaciones', [])
+            by_id = {
+                int(e['id']): e.get('explicacion', '')
+                for e in entries if isinstance(e, dict) and 'id' in e
+            }
+        except Exception as e:
+            logger.error(
+                "Error en explicación en lote: %s", e,
+                exc_info=_traceback_wanted(e, AI_SERVICE_ERRORS + (orjson.JSONDecodeError,)),
+            )
+            by_id = {}
+
+        return [by_id.get(i) or '' for i in range(1, len(reactions) + 1)]
+
+    def cached_reaction_explanation(self, reaction, level='intermediate'):
         """
-        Genera explicación científica de una reacción química.
-        
-        Args:
-            reaction: Objeto Reaction de la base de datos
-            level: 'basic', 'intermediate', o 'advanced'
-        
+        Explicación de explain_reaction ya disponible, sin generar otra:
+        la cacheada o, si este proceso la está generando, la de esa
+        generación (se espera a que termine). None si no hay ninguna.
+
         Returns:
-            str: Explicación generada por el modelo de IA
+            tuple | None: (explicación, origen) como explain_reaction
         """
-        prompt = self._build_prompt(reaction, level)
+        key = self._reaction_cache_key(reaction, level)
+        entry = cache.get(key)
+        if entry is not None:
+            return _cached_result(entry)
+
+        with DeepSeekService._inflight_lock:
+            future = DeepSeekService._inflight.get(key)
+        if future is None:
+            return None
+        explanation, source = future.result()
+        return explanation, _shared_source(source)
+
+    def explain_reaction_stream(self, reaction, level='intermediate'):
+        """
+        Genera la explicación de una reacción fragmento a fragmento.
+
+        Pensado para Server-Sent Events: el primer token llega en cuanto
+        Ollama lo produce, sin el bloque de pensamiento ni el prefijo
+        iniciales (ver _clean_stream). Si la IA no está disponible emite el
+        fallback completo en un único fragmento. Una respuesta completa y
+        válida se guarda en la misma caché que explain_reaction (ver
+        cached_reaction_explanation).
+        """
+        if not self.is_available():
+            logger.warning("Ollama no está disponible, usando fallback")
+            yield self._get_fallback_explanation(reaction, level)
+            return
         
+        prompt = self._build_prompt(reaction, level)
+        max_tokens = REACTION_TOKEN_LIMITS.get(level, 350)
+        tokens = self._stream_ollama(prompt, max_tokens=max_tokens, system=REACTION_SYSTEM_PROMPT)
+        parts = []
+        try:
+            for token in _clean_stream(tokens):
+                parts.append(token)
+                yield token
+        except Exception as e:
+            self._record_failure(e)
+            raise
+        self._record_success()
+
+        explanation, from_ai = self._reaction_result(reaction, level, ''.join(parts))
+        if from_ai:
+            cache.set(
+                self._reaction_cache_key(reaction, level),
+                (explanation, True), EXPLANATION_CACHE_TIMEOUT,
+            )
+
+    def _generate_reaction_explanation(self, reaction, level):
+        """Llama a Ollama para una reacción. Retorna (texto, generado_por_ia)."""
+        prompt = self._build_prompt(reaction, level)
+
         try:
             # Verificar disponibilidad primero
             if not self.is_available():
                 logger.warning("Ollama no está disponible, usando fallback")
-                return self._get_fallback_explanation(reaction, level)
+                return self._get_fallback_explanation(reaction, level), False
             
             # Tokens adaptativos por nivel para reacciones (optimizado para velocidad)
-            token_limits = {'basic': 200, 'intermediate': 350, 'advanced': 500}
-            max_tokens = token_limits.get(level, 350)
+            max_tokens = REACTION_TOKEN_LIMITS.get(level, 350)
             
             # Intentar obtener respuesta
-            response = self._call_ollama(prompt, max_tokens=max_tokens)
-            cleaned = self._clean_response(response)
-            
-            # Validar que la respuesta no esté vacía
-            if not cleaned or len(cleaned.strip()) < 20:
-                logger.warning(f"Respuesta vacía o muy corta del modelo: '{response[:100] if response else 'None'}'")
-                return self._get_fallback_explanation(reaction, level)
-            
-            return cleaned
-            
+            response = self._call_ollama(prompt, max_tokens=max_tokens, system=REACTION_SYSTEM_PROMPT)
+            return self._reaction_result(reaction, level, response)
+
         except Exception as e:
-            logger.error(f"Error calling AI model: {e}", exc_info=True)
+            logger.error("Error calling AI model: %s", e, exc_info=_traceback_wanted(e))
             # Fallback a descripción almacenada
-            return reaction.description or self._get_fallback_explanation(reaction, level)
-    
-    def _build_prompt(self, reaction, level):
-        """Construye el prompt para DeepSeek."""
-        
-        level_instructions = {
-            'basic': """
-Explica esta reacción química para un estudiante de secundaria.
-Usa lenguaje simple y ejemplos cotidianos.
-Evita términos técnicos complejos.
-Mínimo 200 palabras, máximo 300 palabras.
-
-Incluye:
-1. Qué sucede paso a paso en la reacción
-2. Por qué ocurre esta reacción
-3. Un ejemplo de la vida cotidiana donde se ve esto
-4. Qué observaríamos si hiciéramos esta reacción
-""",
-            'intermediate': """
-Explica esta reacción química para un estudiante universitario de primer año.
-Mínimo 400 palabras, máximo 500 palabras.
-
-Incluye:
-1. Descripción detallada del mecanismo de reacción
-2. Tipos de enlaces que se rompen y se forman
-3. Análisis de electronegatividad de los elementos involucrados
-4. Explicación energética (por qué es exotérmica o endotérmica)
-5. Condiciones necesarias para que ocurra
-6. Aplicaciones prácticas en la industria o laboratorio
-7. Precauciones de seguridad relevantes
-""",
-            'advanced': """
-Explica esta reacción química con rigor científico avanzado y profesional.
-Mínimo 600 palabras, máximo 800 palabras.
-
-Incluye:
-1. Mecanismo de reacción detallado paso a paso
-2. Teoría de orbitales moleculares involucrados
-3. Análisis termodinámico completo (ΔH, ΔG, ΔS)
-4. Cinética de la reacción y factores que la afectan
-5. Estados de transición y energía de activación
-6. Configuraciones electrónicas de reactivos y productos
-7. Aplicaciones industriales y de investigación
-8. Historia del descubrimiento de esta reacción
-9. Variantes y reacciones relacionadas
-10. Impacto ambiental o tecnológico si es relevante
-"""
-        }
-        
-        # Construir contexto de la reacción
-        reaction_context = f"""
-REACCIÓN: {reaction.equation}
-TIPO: {reaction.get_reaction_type_display()}
-REACTIVOS: {', '.join([r.get('symbol', r.get('formula', '')) for r in reaction.reactants])}
-PRODUCTOS: {', '.join([p.get('formula', p.get('name', '')) for p in reaction.products])}
-CAMBIO DE ENTALPÍA: {reaction.enthalpy_change or 'No especificado'} kJ/mol
-REACCIÓN {'EXOTÉRMICA' if reaction.is_exothermic else 'ENDOTÉRMICA'}
-"""
-        
-        prompt = f"""Eres un profesor de química experto. Tu tarea es explicar la siguiente reacción química REAL.
+            return reaction.description or self._get_fallback_explanation(reaction, level), False
 
-{reaction_context}
+    def _reaction_result(self, reaction, level, response):
+        """Limpia la respuesta del modelo; si queda vacía usa el fallback."""
+        cleaned = self.clean_response(response)
 
-INSTRUCCIONES:
-{level_instructions.get(level, level_instructions['intermediate'])}
+        # Validar que la respuesta no esté vacía
+        if not cleaned or len(cleaned.strip()) < 20:
+            logger.warning("Respuesta vacía o muy corta del modelo: '%.100s'", response or 'None')
+            return self._get_fallback_explanation(reaction, level), False
 
-IMPORTANTE:
-- Solo explica lo que REALMENTE ocurre en esta reacción
-- No inventes información ni reacciones alternativas
-- Sé preciso y educativo
-- Responde en español
-
-Tu explicación:"""
-        
-        return prompt
+        return cleaned, True
     
-    def _call_ollama(self, prompt, max_tokens=None):
-        """Llama a la API de Ollama con parámetros optimizados."""
-        url = f"{self.base_url}/api/generate"
-        
+    def _build_prompt(self, reaction, level):
+        """Construye la parte variable del prompt (ver REACTION_SYSTEM_PROMPT)."""
+        return _render_reaction_prompt(level=level, **_reaction_prompt_fields(reaction))
+    
+    def _build_payload(self, prompt, max_tokens=None, system=None, stream=True, format=None):
+        """Construye el cuerpo de /api/generate con parámetros optimizados."""
         # Tokens adaptativos basados en nivel: optimizado para velocidad
         num_tokens = max_tokens or 400  # Reducido para respuestas más rápidas
         
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": True,  # Activar streaming para ver progreso
+            "stream": stream,
+            "keep_alive": self.keep_alive,
             "options": {
-                "temperature": 0.7,  # Balance entre creatividad y coherencia
-                "top_p": 0.9,
+                **self._BASE_OPTIONS,
                 "num_predict": num_tokens,
-                "num_ctx": 2048  # Contexto reducido para mayor velocidad
-            }
+                "num_ctx": self._context_size(prompt, system, num_tokens),
+            },
         }
         
-        logger.info(f"🚀 Llamando a Ollama API con modelo: {self.model}")
-        logger.info(f"📝 Tokens máximos: {num_tokens}")
+        if system:
+            payload["system"] = system
+        if format:
+            payload["format"] = format  # p. ej. 'json' para salida estructurada
+        
+        return payload
+    
+    def _context_size(self, prompt, system, num_tokens):
+        """
+        Ventana de contexto para la petición.
+
+        Se usa `num_ctx` salvo que prompt + respuesta no quepan (p. ej. en
+        lotes); entonces se dobla hasta que quepan, sin pasar de
+        `num_ctx_cap`. Pocos tamaños distintos = pocas recargas del modelo.
+        """
+        words = len(prompt.split()) + (len(system.split()) if system else 0)
+        needed = int(words * 1.5) + num_tokens
+        size = self.num_ctx
+        while size < needed and size < self.num_ctx_cap:
+            size *= 2
+        return min(size, self.num_ctx_cap)
+    
+    def _stream_ollama(self, prompt, max_tokens=None, system=None, format=None):
+        """Genera los fragmentos de texto de Ollama a medida que llegan."""
+        url = f"{self.base_url}/api/generate"
+        payload = self._build_payload(prompt, max_tokens, system, format=format)
         
-        full_response = ""
-        token_count = 0
+        with self.session.post(url, json=payload, timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                try:
+                    data = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue
+                
+                token = data.get('response', '')
+                if token:
+                    yield token
+                
+                # Verificar si terminó
+                if data.get('done', False):
+                    break
+    
+    def _call_ollama(self, prompt, max_tokens=None, system=None, format=None):
+        """Llama a Ollama reintentando los fallos transitorios."""
+        for attempt in range(RETRY_ATTEMPTS):
+            # Otro hilo (o un grupo anterior del lote) puede haber abierto el circuito
+            if self._circuit_open():
+                raise CircuitOpenError("Circuito abierto: Ollama no se consulta")
+            try:
+                response = self._call_ollama_once(prompt, max_tokens, system, format)
+            except Exception as e:
+                if attempt + 1 < RETRY_ATTEMPTS and _is_transient_error(e):
+                    logger.warning("Error transitorio en Ollama (%s); reintento %d", e, attempt + 1)
+                    time.sleep(_retry_delay(attempt))
+                    continue
+                self._record_failure(e)
+                raise
+            self._record_success()
+            return response
+    
+    def _call_ollama_once(self, prompt, max_tokens=None, system=None, format=None):
+        """
+        Llama a la API de Ollama y devuelve la respuesta completa.
+
+        `system` lleva las instrucciones fijas; `keep_alive` mantiene el
+        modelo cargado entre peticiones.
+        """
+        logger.info("🚀 Llamando a Ollama API con modelo: %s", self.model)
+        logger.info("📝 Tokens máximos: %s", max_tokens or 400)
         
         try:
-            # Usar streaming para ver progreso
-            with requests.post(url, json=payload, timeout=self.timeout, stream=True) as response:
+            if logger.isEnabledFor(logging.DEBUG):
+                # En desarrollo se usa streaming para ver el progreso
+                full_response = self._collect_stream(prompt, max_tokens, system, format)
+            else:
+                payload = self._build_payload(prompt, max_tokens, system, stream=False, format=format)
+                response = self.session.post(
+                    f"{self.base_url}/api/generate", json=payload, timeout=self.timeout
+                )
                 response.raise_for_status()
-                
-                for line in response.iter_lines():
-                    if line:
-                        try:
-                            data = json.loads(line)
-                            token = data.get('response', '')
-                            full_response += token
-                            token_count += 1
-                            
-                            # Log cada 20 tokens para ver progreso
-                            if token_count % 20 == 0:
-                                logger.info(f"⏳ Generando... {token_count} tokens ({len(full_response)} chars)")
-                            
-                            # Verificar si terminó
-                            if data.get('done', False):
-                                logger.info(f"✅ Generación completada: {token_count} tokens, {len(full_response)} chars")
-                                break
-                        except json.JSONDecodeError:
-                            continue
+                full_response = response.json().get('response', '')
             
-            logger.info(f"📊 Respuesta final: {len(full_response)} caracteres")
+            logger.info("✅ Generación completada: %d chars", len(full_response))
             
             if not full_response:
-                logger.warning(f"⚠️ Respuesta vacía de Ollama")
+                logger.warning("⚠️ Respuesta vacía de Ollama")
             else:
                 # Mostrar primeros 200 chars en log
-                logger.info(f"📄 Preview: {full_response[:200]}...")
+                logger.info("📄 Preview: %.200s...", full_response)
             
             return full_response
             
         except requests.exceptions.Timeout:
-            logger.error(f"⏱️ Timeout después de {self.timeout}s")
+            logger.error("⏱️ Timeout después de %ss", self.timeout)
             raise
         except Exception as e:
-            logger.error(f"❌ Error en Ollama: {e}")
+            logger.error("❌ Error en Ollama: %s", e)
             raise
     
-    def _clean_response(self, response):
+    def _collect_stream(self, prompt, max_tokens=None, system=None, format=None):
+        """Consume el streaming de Ollama registrando el progreso cada 20 tokens."""
+        parts = []
+        chars = 0
+        for token in self._stream_ollama(prompt, max_tokens, system, format):
+            parts.append(token)
+            chars += len(token)
+            if len(parts) % 20 == 0:
+                logger.debug("⏳ Generando... %d tokens (%d chars)", len(parts), chars)
+        return ''.join(parts)
+    
+    @staticmethod
+    def clean_response(response):
         """Limpia la respuesta del modelo de IA."""
         if not response:
             return ""
-            
-        import re
         
-        # Remover etiquetas <think>...</think> si existen (usadas por DeepSeek-R1)
-        response = re.sub(r'<think>.*?</think>', '', response, flags=re.DOTALL)
-        
-        # Remover otros posibles patrones de "pensamiento"
-        response = re.sub(r'\[THINKING\].*?\[/THINKING\]', '', response, flags=re.DOTALL | re.IGNORECASE)
-        response = re.sub(r'\*\*Pensando\*\*:.*?(?=\n\n|\Z)', '', response, flags=re.DOTALL)
+        # Remover bloques de "pensamiento" (<think>, [THINKING], **Pensando**:)
+        response = THINKING_RE.sub('', response)
         
         # Remover prefijos comunes que el modelo podría agregar
-        response = re.sub(r'^(Explicación:|Tu explicación:|Respuesta:)\s*', '', response, flags=re.IGNORECASE)
+        response = PREFIX_RE.sub('', response)
         
-        # Normalizar espacios en blanco
-        response = re.sub(r'\n{3,}', '\n\n', response)  # Máximo 2 saltos de línea consecutivos
-        response = re.sub(r' {2,}', ' ', response)  # Un solo espacio
+        # Normalizar espacios: máximo 2 saltos de línea y un solo espacio
+        response = WHITESPACE_RE.sub(_normalize_whitespace, response)
         
         return response.strip()
     
     def _get_fallback_explanation(self, reaction, level):
         """Genera explicación de respaldo cuando Ollama no está disponible."""
-        basic = f"""
-Esta es una reacción de {reaction.get_reaction_type_display().lower()}.
-En ella, {self._describe_reactants(reaction)} se combinan para formar {self._describe_products(reaction)}.
-{'Esta reacción libera energía (exotérmica).' if reaction.is_exothermic else 'Esta reacción absorbe energía (endotérmica).'}
-"""
-        
-        if level == 'basic':
-            return basic.strip()
-        
-        intermediate = basic + f"""
-El cambio de entalpía es de {reaction.enthalpy_change or 'un valor no especificado'} kJ/mol.
-"""
-        
-        if level == 'intermediate':
-            return intermediate.strip()
-        
-        # Advanced incluye aplicaciones
-        apps = reaction.real_world_applications
-        apps_text = f"\n\nAplicaciones: {', '.join(apps)}" if apps else ""
-        
-        return (intermediate + apps_text).strip()
+        return _render_reaction_fallback(
+            reaction.get_reaction_type_display(),
+            self._describe_reactants(reaction),
+            self._describe_products(reaction),
+            reaction.is_exothermic,
+            reaction.enthalpy_change,
+            tuple(reaction.real_world_applications or ()),
+            level,
+        )
     
     def _describe_reactants(self, reaction):
         """Describe los reactivos en lenguaje natural."""
-        names = []
-        for r in reaction.reactants:
-            if 'symbol' in r:
-                names.append(r['symbol'])
-            elif 'formula' in r:
-                names.append(r['formula'])
-        return ' y '.join(names) if names else 'los reactivos'
+        # reactants_display se rellena en pre_save; bulk_create/update() no lo disparan
+        return (
+            reaction.reactants_display
+            or describe_species(reaction.reactants, ('symbol', 'formula'))
+            or 'los reactivos'
+        )
     
     def _describe_products(self, reaction):
         """Describe los productos en lenguaje natural."""
-        names = []
-        for p in reaction.products:
-            if 'name' in p:
-                names.append(p['name'])
-            elif 'formula' in p:
-                names.append(p['formula'])
-        return ' y '.join(names) if names else 'los productos'
+        return (
+            reaction.products_display
+            or describe_species(reaction.products, ('name', 'formula'))
+            or 'los productos'
+        )
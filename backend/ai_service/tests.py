@@ -1,3 +1,176 @@
-from django.test import TestCase
+import time
+from unittest import mock
 
-# Create your tests here.
+import orjson
+import requests
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from reactions.models import Reaction
+
+from .service import (
+    CIRCUIT_FAILURE_THRESHOLD, SOURCE_CACHE, CircuitOpenError, DeepSeekService,
+    _clean_stream,
+)
+
+
+def make_reaction(pk=1, equation='2H₂ + O₂ → 2H₂O'):
+    """Reacción sin guardar: el servicio solo lee sus campos."""
+    return Reaction(
+        id=pk,
+        equation=equation,
+        reaction_type='synthesis',
+        reactants=[{'formula': 'H2', 'elements': ['H']}, {'formula': 'O2', 'elements': ['O']}],
+        products=[{'formula': 'H2O', 'count': 2}],
+        description='Síntesis de agua',
+    )
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    """El circuito abierto corta las llamadas a Ollama."""
+
+    def setUp(self):
+        self.service = DeepSeekService()
+        self.addCleanup(self.reset_circuit)
+
+    def reset_circuit(self):
+        DeepSeekService._failure_count = 0
+        DeepSeekService._circuit_open_until = 0.0
+
+    def test_open_circuit_skips_ollama(self):
+        DeepSeekService._circuit_open_until = time.monotonic() + 60
+        with mock.patch.object(DeepSeekService, '_call_ollama_once') as call:
+            with self.assertRaises(CircuitOpenError):
+                self.service._call_ollama('prompt')
+        call.assert_not_called()
+
+    def test_stream_failures_open_the_circuit(self):
+        def failing_stream(*args, **kwargs):
+            raise requests.ConnectionError('refused')
+            yield
+
+        with mock.patch.object(DeepSeekService, 'is_available', return_value=True), \
+                mock.patch.object(DeepSeekService, '_stream_ollama', side_effect=failing_stream):
+            with self.assertLogs('ai_service.service', 'ERROR'):
+                for _ in range(CIRCUIT_FAILURE_THRESHOLD):
+                    with self.assertRaises(requests.ConnectionError):
+                        list(self.service.explain_reaction_stream(make_reaction(), 'basic'))
+
+        self.assertTrue(self.service._circuit_open())
+
+
+class BulkExplanationTests(SimpleTestCase):
+    """explain_reactions_bulk / _generate_bulk_group con Ollama simulado."""
+
+    def setUp(self):
+        cache.clear()
+        self.service = DeepSeekService()
+        self.reactions = [make_reaction(pk, f'Reacción {pk}') for pk in range(1, 6)]
+        patcher = mock.patch.object(DeepSeekService, 'is_available', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def explanation(self, index):
+        return f'Explicación detallada número {index} de la reacción.'
+
+    def ollama_reply(self, *ids):
+        return orjson.dumps({
+            'explicaciones': [{'id': i, 'explicacion': self.explanation(i)} for i in ids],
+        }).decode()
+
+    def test_parses_one_explanation_per_id_and_caches_them(self):
+        reactions = self.reactions[:2]
+        with mock.patch.object(
+            DeepSeekService, '_call_ollama', return_value=self.ollama_reply(2, 1)
+        ) as call:
+            first = self.service.explain_reactions_bulk(reactions, 'basic')
+            second = self.service.explain_reactions_bulk(reactions, 'basic')
+
+        self.assertEqual(first, [self.explanation(1), self.explanation(2)])
+        self.assertEqual(second, first)
+        call.assert_called_once()
+        self.assertEqual(call.call_args.kwargs['format'], 'json')
+
+    def test_missing_id_falls_back_without_caching(self):
+        reactions = self.reactions[:2]
+        fallback = self.service._get_fallback_explanation(reactions[1], 'basic')
+        with mock.patch.object(
+            DeepSeekService, '_call_ollama', return_value=self.ollama_reply(1)
+        ):
+            result = self.service.explain_reactions_bulk(reactions, 'basic')
+
+        self.assertEqual(result, [self.explanation(1), fallback])
+        self.assertIsNotNone(cache.get(self.service._bulk_cache_key(reactions[0], 'basic')))
+        self.assertIsNone(cache.get(self.service._bulk_cache_key(reactions[1], 'basic')))
+
+    def test_invalid_json_falls_back_for_the_whole_group(self):
+        reactions = self.reactions[:2]
+        with mock.patch.object(DeepSeekService, '_call_ollama', return_value='no es JSON'), \
+                self.assertLogs('ai_service.service', 'ERROR'):
+            result = self.service.explain_reactions_bulk(reactions, 'basic')
+
+        self.assertEqual(
+            result, [self.service._get_fallback_explanation(r, 'basic') for r in reactions]
+        )
+        self.assertEqual(cache.get_many(
+            [self.service._bulk_cache_key(r, 'basic') for r in reactions]
+        ), {})
+
+    def test_reactions_are_split_into_groups(self):
+        def reply(prompt, **kwargs):
+            return self.ollama_reply(*range(1, prompt.count(') REACCIÓN:') + 1))
+
+        with mock.patch.object(DeepSeekService, '_call_ollama', side_effect=reply) as call:
+            result = self.service.explain_reactions_bulk(self.reactions, 'basic', group_size=2)
+
+        prompts = [c.args[0] for c in call.call_args_list]
+        self.assertEqual([p.count(') REACCIÓN:') for p in prompts], [2, 2, 1])
+        self.assertIn('Reacción 5', prompts[2])
+        self.assertEqual(result, [self.explanation(i) for i in (1, 2, 1, 2, 1)])
+
+
+class StreamCacheTests(SimpleTestCase):
+    """explain_reaction_stream comparte la caché de explain_reaction."""
+
+    def setUp(self):
+        cache.clear()
+        self.service = DeepSeekService()
+        self.reaction = make_reaction()
+
+    def test_completed_stream_is_cached(self):
+        tokens = ['El hidrógeno', ' y el oxígeno', ' forman agua.']
+        with mock.patch.object(DeepSeekService, 'is_available', return_value=True), \
+                mock.patch.object(DeepSeekService, '_stream_ollama', return_value=iter(tokens)):
+            self.assertEqual(list(self.service.explain_reaction_stream(self.reaction, 'basic')), tokens)
+
+        with mock.patch.object(DeepSeekService, '_generate_reaction_explanation') as generate:
+            result = self.service.explain_reaction(self.reaction, 'basic')
+        generate.assert_not_called()
+        self.assertEqual(result, (''.join(tokens), SOURCE_CACHE))
+        self.assertEqual(
+            self.service.cached_reaction_explanation(self.reaction, 'basic'), result
+        )
+
+    def test_interrupted_stream_is_not_cached(self):
+        tokens = ['El hidrógeno', ' y el oxígeno', ' forman agua.']
+        with mock.patch.object(DeepSeekService, 'is_available', return_value=True), \
+                mock.patch.object(DeepSeekService, '_stream_ollama', return_value=iter(tokens)):
+            stream = self.service.explain_reaction_stream(self.reaction, 'basic')
+            next(stream)
+            stream.close()
+
+        self.assertIsNone(self.service.cached_reaction_explanation(self.reaction, 'basic'))
+
+
+class CleanStreamTests(SimpleTestCase):
+    """_clean_stream: descarta el pensamiento y el prefijo iniciales del streaming."""
+
+    def test_plain_tokens_pass_through(self):
+        self.assertEqual(list(_clean_stream(['Hola', ' mundo'])), ['Hola', ' mundo'])
+
+    def test_thinking_block_split_across_tokens(self):
+        tokens = ['<th', 'ink>razono</think>', '\n\nExplicación: ', 'El sodio', ' reacciona']
+        self.assertEqual(''.join(_clean_stream(tokens)), 'El sodio reacciona')
+
+    def test_prefix_split_across_tokens(self):
+        self.assertEqual(list(_clean_stream(['Expl', 'icación:', ' El agua'])), ['El agua'])
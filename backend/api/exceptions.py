@@ -26,7 +26,7 @@ def custom_exception_handler(exc, context):
         response.data = custom_response
     else:
         # Error no manejado - log y respuesta genérica
-        logger.exception(f"Unhandled exception: {exc}")
+        logger.exception("Unhandled exception: %s", exc)
         response = Response(
             {
                 'success': False,
@@ -47,13 +47,16 @@ def get_error_message(data):
         if 'detail' in data:
             return str(data['detail'])
         # Errores de validación
-        messages = []
-        for field, errors in data.items():
-            if isinstance(errors, list):
-                messages.append(f"{field}: {', '.join(str(e) for e in errors)}")
-            else:
-                messages.append(f"{field}: {errors}")
-        return '; '.join(messages) if messages else 'Error de validación'
+        return '; '.join(
+            _format_field_errors(field, errors) for field, errors in data.items()
+        ) or 'Error de validación'
     elif isinstance(data, list):
         return '; '.join(str(item) for item in data)
     return str(data)
+
+
+def _format_field_errors(field, errors):
+    """Formatea "campo: error1, error2" para un campo de un error de validación."""
+    if isinstance(errors, list):
+        return f"{field}: {', '.join(map(str, errors))}"
+    return f"{field}: {errors}"
@@ -0,0 +1,23 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+
+class FieldFilterBackend(BaseFilterBackend):
+    """
+    Filtros de igualdad por query params (?campo=valor) sobre los campos
+    declarados en `filterset_fields` de la vista.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        filters = {
+            field: request.query_params[field]
+            for field in getattr(view, 'filterset_fields', ())
+            if field in request.query_params
+        }
+        if not filters:
+            return queryset
+        try:
+            return queryset.filter(**filters)
+        except (ValueError, DjangoValidationError) as e:
+            raise ValidationError({'filters': str(e)})
@@ -0,0 +1,42 @@
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer de DRF serializado con orjson (mucho más rápido que json).
+
+    Los tipos que orjson no conoce (Decimal, lazy strings, querysets...)
+    pasan por el encoder de DRF. Si el cliente pide `indent`, se delega
+    en el renderer original.
+    """
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        return orjson.dumps(data, default=self._encoder.default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Renderer para las acciones que responden con Server-Sent Events.
+
+    El cuerpo lo genera la vista (StreamingHttpResponse); este renderer solo
+    permite negociar `Accept: text/event-stream` (lo que envía EventSource)
+    y formatea como un evento `data:` las respuestas de error de DRF.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return b"data: " + orjson.dumps(data, default=ORJSONRenderer._encoder.default) + b"\n\n"
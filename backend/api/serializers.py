@@ -1,11 +1,33 @@
+import copy
+
 from rest_framework import serializers
-from elements.models import Element
+from elements.models import Element, get_valid_symbols
 from reactions.models import Reaction, ReactionElement
+from ai_service.service import REACTION_EXPLANATION_FIELDS
+from ai_service.jobs import background_jobs_available
+
+
+class CachedFieldsModelSerializer(serializers.ModelSerializer):
+    """
+    ModelSerializer que introspecciona el modelo una sola vez por clase.
+
+    get_fields() de ModelSerializer reconstruye todos los campos en cada
+    instancia; aquí se guardan como prototipos sin enlazar y cada instancia
+    recibe copias superficiales, que Serializer.fields enlaza (bind) a ella.
+    Un deepcopy costaría tanto como reconstruirlos.
+    """
+    _fields_cache = {}
 
+    def get_fields(self):
+        cls = type(self)
+        fields = CachedFieldsModelSerializer._fields_cache.get(cls)
+        if fields is None:
+            fields = CachedFieldsModelSerializer._fields_cache[cls] = super().get_fields()
+        return {name: copy.copy(field) for name, field in fields.items()}
 
-class ElementSerializer(serializers.ModelSerializer):
+
+class ElementSerializer(CachedFieldsModelSerializer):
     """Serializer completo para Element."""
-    electron_shells = serializers.SerializerMethodField()
     
     class Meta:
         model = Element
@@ -16,12 +38,9 @@ class ElementSerializer(serializers.ModelSerializer):
             'density', 'melting_point', 'boiling_point',
             'period', 'group', 'color_hex', 'electron_shells'
         ]
-    
-    def get_electron_shells(self, obj):
-        return obj.get_electron_shells()
 
 
-class ElementListSerializer(serializers.ModelSerializer):
+class ElementListSerializer(CachedFieldsModelSerializer):
     """Serializer reducido para lista de elementos (tabla periódica)."""
     
     class Meta:
@@ -32,7 +51,7 @@ class ElementListSerializer(serializers.ModelSerializer):
         ]
 
 
-class ReactionSerializer(serializers.ModelSerializer):
+class ReactionSerializer(CachedFieldsModelSerializer):
     """Serializer completo para Reaction."""
     element_symbols = serializers.SerializerMethodField()
     
@@ -50,7 +69,7 @@ class ReactionSerializer(serializers.ModelSerializer):
         return obj.get_element_symbols()
 
 
-class ReactionListSerializer(serializers.ModelSerializer):
+class ReactionListSerializer(CachedFieldsModelSerializer):
     """Serializer reducido para lista de reacciones."""
     
     class Meta:
@@ -75,11 +94,14 @@ class ReactionValidationSerializer(serializers.Serializer):
         # Convertir a mayúsculas y validar
         symbols = [s.strip().capitalize() for s in value]
         
-        # Verificar que existan en la base de datos
-        existing = Element.objects.filter(symbol__in=symbols).values_list('symbol', flat=True)
-        existing_set = set(existing)
+        # Verificar que existan (conjunto cacheado, sin consulta por petición)
+        valid_symbols = get_valid_symbols()
         
-        invalid = [s for s in symbols if s not in existing_set]
+        invalid = [s for s in symbols if s not in valid_symbols]
+        if invalid:
+            # La caché puede ir por detrás de la BD (cambios en otro proceso)
+            existing = set(Element.objects.filter(symbol__in=invalid).values_list('symbol', flat=True))
+            invalid = [s for s in invalid if s not in existing]
         if invalid:
             raise serializers.ValidationError(
                 f"Elementos no encontrados: {', '.join(invalid)}"
@@ -88,16 +110,63 @@ class ReactionValidationSerializer(serializers.Serializer):
         return symbols
 
 
-class ExplanationRequestSerializer(serializers.Serializer):
-    """Serializer para solicitar explicación de reacción."""
-    reaction_id = serializers.IntegerField()
+class ExplanationLevelSerializer(serializers.Serializer):
+    """Serializer para el nivel de detalle de una explicación."""
     level = serializers.ChoiceField(
         choices=['basic', 'intermediate', 'advanced'],
         default='intermediate'
     )
+
+
+class ExplanationRequestSerializer(ExplanationLevelSerializer):
+    """Serializer para solicitar explicación de reacción."""
+    reaction_id = serializers.IntegerField()
+    background = serializers.BooleanField(default=False)
     
     def validate_reaction_id(self, value):
-        """Valida que la reacción exista."""
-        if not Reaction.objects.filter(id=value).exists():
+        """Valida que la reacción exista (y la carga para no repetir la consulta)."""
+        self._reaction = (
+            Reaction.objects.only(*REACTION_EXPLANATION_FIELDS).filter(id=value).first()
+        )
+        if self._reaction is None:
             raise serializers.ValidationError("Reacción no encontrada")
         return value
+    
+    def validate_background(self, value):
+        """Sin caché compartida el estado del trabajo no llegaría a otros procesos."""
+        if value and not background_jobs_available():
+            raise serializers.ValidationError(
+                "Las explicaciones en segundo plano requieren una caché compartida (REDIS_URL)"
+            )
+        return value
+    
+    def validate(self, attrs):
+        attrs['reaction'] = self._reaction
+        return attrs
+
+
+class BulkExplanationRequestSerializer(ExplanationLevelSerializer):
+    """Serializer para solicitar explicaciones de varias reacciones."""
+    reaction_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        min_length=1,
+        max_length=30,
+        help_text="Lista de ids de reacciones (ej: [1, 2, 3])"
+    )
+    
+    def validate_reaction_ids(self, value):
+        """Valida que las reacciones existan (y las carga en el mismo orden)."""
+        found = Reaction.objects.only(*REACTION_EXPLANATION_FIELDS).in_bulk(value)
+        
+        invalid = [str(i) for i in value if i not in found]
+        if invalid:
+            raise serializers.ValidationError(
+                f"Reacciones no encontradas: {', '.join(invalid)}"
+            )
+        
+        self._reactions = [found[i] for i in value]
+        return value
+    
+    def validate(self, attrs):
+        attrs['reactions'] = self._reactions
+        return attrs
@@ -1,3 +1,198 @@
-from django.test import TestCase
+import itertools
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from ai_service.service import SOURCE_FALLBACK, CircuitOpenError, DeepSeekService
+from api.views import ReactionViewSet, VALIDATE_MAX_RESULTS
+from reactions.models import Reaction, collect_reactant_symbols
+
+
+class ReactionTestCase(TestCase):
+    """Una reacción de ejemplo y la caché vacía (el throttle de IA vive en ella)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reaction = Reaction.objects.create(
+            equation='2Na + Cl₂ → 2NaCl',
+            equation_html='2Na + Cl<sub>2</sub> → 2NaCl',
+            reaction_type='synthesis',
+            reactants=[{'symbol': 'Na', 'count': 2}, {'formula': 'Cl2', 'elements': ['Cl']}],
+            products=[{'formula': 'NaCl', 'count': 2, 'name': 'Cloruro de sodio'}],
+            description='Síntesis de cloruro de sodio',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+
+class ExplainStreamTests(ReactionTestCase):
+    """GET /api/reactions/{id}/explain_stream/ (Server-Sent Events)."""
+
+    def test_event_source_accept_header(self):
+        with mock.patch.object(
+            DeepSeekService, 'explain_reaction_stream', return_value=iter(['Hola', ' mundo'])
+        ):
+            response = self.client.get(
+                f'/api/reactions/{self.reaction.id}/explain_stream/',
+                {'level': 'basic'},
+                HTTP_ACCEPT='text/event-stream',
+            )
+            body = b''.join(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertEqual(body.split(b'\n\n'), [
+            b'data: {"token":"Hola"}',
+            b'data: {"token":" mundo"}',
+            b'data: {"final":"Hola mundo"}',
+            b'data: [DONE]',
+            b'',
+        ])
+
+    def test_cached_explanation_is_a_single_final_event(self):
+        with mock.patch.object(
+            DeepSeekService, '_generate_reaction_explanation', return_value=('Ya explicada', True)
+        ):
+            DeepSeekService().explain_reaction(self.reaction, 'basic')
+
+        with mock.patch.object(DeepSeekService, 'explain_reaction_stream') as stream:
+            response = self.client.get(
+                f'/api/reactions/{self.reaction.id}/explain_stream/',
+                {'level': 'basic'},
+                HTTP_ACCEPT='text/event-stream',
+            )
+            body = b''.join(response.streaming_content)
+
+        stream.assert_not_called()
+        self.assertEqual(body.split(b'\n\n'), [
+            b'data: {"final":"Ya explicada"}',
+            b'data: [DONE]',
+            b'',
+        ])
+
+    def test_event_source_error_is_an_event(self):
+        response = self.client.get(
+            f'/api/reactions/{self.reaction.id}/explain_stream/',
+            {'level': 'bogus'},
+            HTTP_ACCEPT='text/event-stream',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.content.startswith(b'data: {"success":false'))
+
+
+
+class ReactionListCacheTests(ReactionTestCase):
+    """El listado cacheado de /api/reactions/ se invalida con las señales de Reaction."""
+
+    def equations(self, **params):
+        return [row['equation'] for row in self.client.get('/api/reactions/', params).json()]
+
+    def test_save_and_delete_invalidate_the_cached_list(self):
+        self.assertEqual(self.equations(), [self.reaction.equation])
+        self.assertEqual(self.equations(reaction_type='synthesis'), [self.reaction.equation])
+
+        other = Reaction.objects.create(
+            equation='Zn + 2HCl → ZnCl₂ + H₂',
+            reaction_type='single-replacement',
+            reactants=[{'symbol': 'Zn'}, {'formula': 'HCl', 'elements': ['H', 'Cl']}],
+            products=[{'formula': 'ZnCl2'}, {'formula': 'H2'}],
+        )
+        self.assertCountEqual(self.equations(), [self.reaction.equation, other.equation])
+
+        other.equation = 'Zn + 2HCl → ZnCl₂ + H₂↑'
+        other.save()
+        self.assertIn(other.equation, self.equations())
+
+        other.delete()
+        self.assertEqual(self.equations(), [self.reaction.equation])
+        self.assertEqual(self.equations(reaction_type='synthesis'), [self.reaction.equation])
+
+
+class BackgroundExplanationTests(ReactionTestCase):
+    """POST /api/reactions/explain/ con "background": true."""
+
+    @override_settings(AI_JOBS_ALLOW_LOCAL_CACHE=False)
+    def test_rejected_with_process_local_cache(self):
+        response = self.client.post(
+            '/api/reactions/explain/',
+            {'reaction_id': self.reaction.id, 'background': True},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('REDIS_URL', response.json()['error']['message'])
+
+
+class ElementExplainTests(TestCase):
+    """POST /api/elements/explain/."""
+
+    fixtures = ['elements_part1']
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ai_failure_returns_the_service_fallback(self):
+        with mock.patch.object(DeepSeekService, 'is_available', return_value=True), \
+                mock.patch.object(DeepSeekService, '_call_ollama', side_effect=CircuitOpenError()), \
+                self.assertLogs('ai_service.service', 'ERROR'):
+            response = self.client.post(
+                '/api/elements/explain/',
+                {'symbol': 'na', 'level': 'basic'},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['source'], SOURCE_FALLBACK)
+        self.assertTrue(data['explanation'].startswith('Sodio (Na)'))
+
+    def test_unknown_level_is_rejected(self):
+        response = self.client.post(
+            '/api/elements/explain/',
+            {'symbol': 'Fe', 'level': 'bogus'},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('level', response.json()['error']['message'])
+
+
+class SymbolMatchTests(TestCase):
+    """find_reactions_for_elements / find_suggestions_for_elements frente a la lógica en Python."""
+
+    fixtures = [f'reactions_part{n}' for n in range(1, 6)]
+
+    def expected(self, reactions, elements):
+        """Resultado esperado calculado en Python con collect_reactant_symbols."""
+        input_symbols = set(elements)
+        symbol_sets = [(r, set(collect_reactant_symbols(r.reactants))) for r in reactions]
+        exact = [r for r, symbols in symbol_sets if symbols == input_symbols]
+        containing = [r for r, symbols in symbol_sets if input_symbols <= symbols]
+        found = exact[:VALIDATE_MAX_RESULTS] if exact else containing[:5]
+        # sorted() es estable: a igual número de coincidencias se mantiene el orden del modelo
+        ranked = sorted(
+            ((len(input_symbols & symbols), r) for r, symbols in symbol_sets
+             if input_symbols & symbols),
+            key=lambda pair: -pair[0],
+        )
+        return [r.id for r in found], [r.id for _, r in ranked[:8]]
+
+    def test_matches_python_logic(self):
+        view = ReactionViewSet()
+        reactions = list(Reaction.objects.order_by(*view._default_ordering()))
+        symbols = sorted(set().union(*(r.reactant_symbols for r in reactions))) + ['Xx']
+        self.assertGreater(len(reactions), 1)
+
+        for size in (1, 2, 3):
+            for elements in itertools.combinations(symbols, size):
+                with self.subTest(elements=elements):
+                    found, suggested = self.expected(reactions, elements)
+                    self.assertEqual(
+                        [r.id for r in view.find_reactions_for_elements(list(elements))], found
+                    )
+                    self.assertEqual(
+                        [r.id for r in view.find_suggestions_for_elements(list(elements))], suggested
+                    )
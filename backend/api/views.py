@@ -1,17 +1,76 @@
+import hashlib
+import re
+import time
+
+import orjson
+
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.throttling import AnonRateThrottle
+from django.db import NotSupportedError, connections
 from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
 
-from elements.models import Element
-from reactions.models import Reaction
+from elements.models import (
+    Element, PERIODIC_TABLE_CACHE_KEY, PERIODIC_TABLE_CACHE_TIMEOUT, canonical_symbol
+)
+from reactions.models import (
+    Reaction, REACTION_LIST_CACHE_TIMEOUT, REACTION_LIST_CACHE_VERSION_KEY
+)
+from .filters import FieldFilterBackend
+from .renderers import ORJSONRenderer, EventStreamRenderer
 from .serializers import (
     ElementSerializer, ElementListSerializer,
     ReactionSerializer, ReactionListSerializer,
-    ReactionValidationSerializer, ExplanationRequestSerializer
+    ReactionValidationSerializer, ExplanationLevelSerializer,
+    ExplanationRequestSerializer, BulkExplanationRequestSerializer
 )
-from ai_service.service import DeepSeekService
+from ai_service.service import DeepSeekService, AI_SERVICE_ERRORS, cache_is_shared
+from ai_service import jobs
+
+
+# Símbolo químico válido: 1 a 3 letras (ej: "H", "Fe", "Uue")
+SYMBOL_RE = re.compile(r'^[A-Za-z]{1,3}$')
+
+# Máximo de coincidencias exactas que devuelve /api/reactions/validate/
+VALIDATE_MAX_RESULTS = 50
+
+# Elementos y longitud de la lista JSON reactant_symbols, por motor de base de datos
+SYMBOL_MATCH_SQL = {
+    'sqlite': ('json_each({column}) AS symbol', 'json_array_length({column})'),
+    'postgresql': (
+        'jsonb_array_elements_text({column}) AS symbol(value)',
+        'jsonb_array_length({column})',
+    ),
+}
+
+# Con una caché propia de cada proceso, las señales que invalidan la tabla
+# periódica y los listados solo alcanzan al proceso que guardó el cambio: el
+# resto puede servir datos viejos como mucho durante estos segundos
+LOCAL_CACHE_MAX_TIMEOUT = 30
+
+def _cached_json_response(request, key, render, timeout):
+    """
+    Sirve el JSON de `render()` desde la cache como (ETag, bytes), sin pasar
+    por DRF, y un 304 si el cliente ya tiene esa versión (If-None-Match).
+    """
+    if not cache_is_shared():
+        timeout = min(timeout, LOCAL_CACHE_MAX_TIMEOUT)
+    
+    def build():
+        body = render()
+        return f'"{hashlib.md5(body).hexdigest()}"', body
+    
+    etag, body = cache.get_or_set(key, build, timeout)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    return response
 
 
 class AIRateThrottle(AnonRateThrottle):
@@ -24,18 +83,25 @@ class ElementViewSet(viewsets.ReadOnlyModelViewSet):
     API ViewSet para elementos químicos.
     
     Endpoints:
-    - GET /api/elements/ - Lista todos los elementos
+    - GET /api/elements/ - Lista todos los elementos (?category=, ?period=, ?group=)
     - GET /api/elements/{symbol}/ - Detalle de un elemento
     - GET /api/elements/by_category/?category=alkali-metal - Filtrar por categoría
     """
     queryset = Element.objects.all()
     lookup_field = 'symbol'
+    filter_backends = [FieldFilterBackend]
+    filterset_fields = ['category', 'period', 'group']
     
     def get_serializer_class(self):
         if self.action == 'list':
             return ElementListSerializer
         return ElementSerializer
     
+    def list(self, request, *args, **kwargs):
+        # Columnas planas: .values() evita instanciar modelos y el serializer
+        elements = self.filter_queryset(self.get_queryset())
+        return Response(list(elements.values(*ElementListSerializer.Meta.fields)))
+    
     @action(detail=False, methods=['get'])
     def by_category(self, request):
         """Filtra elementos por categoría."""
@@ -47,26 +113,28 @@ class ElementViewSet(viewsets.ReadOnlyModelViewSet):
             )
         
         elements = self.queryset.filter(category=category)
-        serializer = ElementListSerializer(elements, many=True)
-        return Response({'elements': serializer.data})
+        return Response({'elements': list(elements.values(*ElementListSerializer.Meta.fields))})
     
     @action(detail=False, methods=['get'])
     def periodic_table(self, request):
         """Retorna todos los elementos organizados para la tabla periódica."""
-        elements = self.queryset.all()
-        serializer = ElementListSerializer(elements, many=True)
+        # La tabla solo cambia al editar elementos (elements.signals borra la cache)
+        return _cached_json_response(
+            request, PERIODIC_TABLE_CACHE_KEY, self._render_periodic_table,
+            PERIODIC_TABLE_CACHE_TIMEOUT
+        )
+    
+    def _render_periodic_table(self):
+        # Columnas planas: .values() evita instanciar modelos y el serializer
+        elements = list(self.queryset.values(*ElementListSerializer.Meta.fields))
         
         # Organizar por período y grupo
         table = {}
-        for elem in serializer.data:
-            period = elem['period']
-            group = elem['group']
-            if period not in table:
-                table[period] = {}
-            table[period][group] = elem
+        for elem in elements:
+            table.setdefault(elem['period'], {})[elem['group']] = elem
         
-        return Response({
-            'elements': serializer.data,
+        return ORJSONRenderer().render({
+            'elements': elements,
             'organized': table
         })
     
@@ -77,8 +145,12 @@ class ElementViewSet(viewsets.ReadOnlyModelViewSet):
         
         Request body: {"symbol": "Fe", "level": "intermediate"}
         """
-        symbol = request.data.get('symbol')
-        level = request.data.get('level', 'intermediate')
+        symbol = str(request.data.get('symbol') or '').strip()
+        
+        # El nivel forma parte de la clave de caché: solo los valores conocidos
+        level_serializer = ExplanationLevelSerializer(data=request.data)
+        level_serializer.is_valid(raise_exception=True)
+        level = level_serializer.validated_data['level']
         
         if not symbol:
             return Response(
@@ -86,48 +158,35 @@ class ElementViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        if not SYMBOL_RE.match(symbol):
+            return Response(
+                {'error': f'Símbolo "{symbol}" no válido'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        # Sin distinguir mayúsculas: por el índice único si el símbolo está en
+        # la caché; si no (caché desfasada), con symbol__iexact
+        canonical = canonical_symbol(symbol)
         try:
-            element = Element.objects.get(symbol__iexact=symbol)
+            if canonical is not None:
+                element = Element.objects.get(symbol=canonical)
+            else:
+                element = Element.objects.get(symbol__iexact=symbol)
         except Element.DoesNotExist:
             return Response(
                 {'error': f'Elemento "{symbol}" no encontrado'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Generar explicación con IA
-        from ai_service.service import DeepSeekService
-        ai_service = DeepSeekService()
-        
-        try:
-            explanation = ai_service.explain_element(element, level)
-            return Response({
-                'success': True,
-                'element': ElementSerializer(element).data,
-                'explanation': explanation,
-                'level': level
-            })
-        except Exception as e:
-            # Fallback a descripción básica
-            fallback = f"""
-{element.name} ({element.symbol}) es un elemento químico con número atómico {element.atomic_number}.
-
-Características principales:
-- Masa atómica: {element.atomic_mass} u
-- Categoría: {element.category}
-- Configuración electrónica: {element.electron_config}
-- Electronegatividad: {element.electronegativity or 'N/A'}
-- Electrones de valencia: {element.valence_electrons}
-
-Este elemento se encuentra en el período {element.period} y grupo {element.group} de la tabla periódica.
-            """.strip()
-            
-            return Response({
-                'success': True,
-                'element': ElementSerializer(element).data,
-                'explanation': fallback,
-                'level': level,
-                'note': 'Explicación generada localmente (IA no disponible)'
-            })
+        # Generar explicación con IA (el servicio ya recurre al fallback local)
+        explanation, source = DeepSeekService().explain_element(element, level)
+        return Response({
+            'success': True,
+            'element': ElementSerializer(element).data,
+            'explanation': explanation,
+            'level': level,
+            'source': source
+        })
 
 
 class ReactionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -135,18 +194,41 @@ class ReactionViewSet(viewsets.ReadOnlyModelViewSet):
     API ViewSet para reacciones químicas.
     
     Endpoints:
-    - GET /api/reactions/ - Lista reacciones
+    - GET /api/reactions/ - Lista reacciones (?reaction_type=, ?difficulty_level=)
     - GET /api/reactions/{id}/ - Detalle de reacción
     - POST /api/reactions/validate/ - Validar combinación de elementos
     - POST /api/reactions/explain/ - Obtener explicación IA
+    - GET /api/reactions/jobs/{job_id}/ - Estado de una explicación en segundo plano
+    - POST /api/reactions/explain_bulk/ - Explicaciones IA de varias reacciones
+    - GET /api/reactions/{id}/explain_stream/?level=basic - Explicación IA en streaming (SSE)
     """
     queryset = Reaction.objects.all()
+    filter_backends = [FieldFilterBackend]
+    filterset_fields = ['reaction_type', 'difficulty_level']
     
     def get_serializer_class(self):
         if self.action == 'list':
             return ReactionListSerializer
         return ReactionSerializer
     
+    def list(self, request, *args, **kwargs):
+        filters = {field: request.query_params.get(field) for field in self.filterset_fields}
+        return _cached_json_response(
+            request, self._list_cache_key('list', filters),
+            lambda: ORJSONRenderer().render(self._list_rows(self.filter_queryset(self.get_queryset()))),
+            REACTION_LIST_CACHE_TIMEOUT
+        )
+    
+    def _list_rows(self, reactions):
+        # Columnas planas: .values() evita instanciar modelos y el serializer
+        return list(reactions.values(*ReactionListSerializer.Meta.fields))
+    
+    def _list_cache_key(self, name, params):
+        """Clave de un listado cacheado: versión de los datos + parámetros."""
+        version = cache.get_or_set(REACTION_LIST_CACHE_VERSION_KEY, time.time_ns, None)
+        digest = hashlib.md5(orjson.dumps(params, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        return f'reactions:{name}:{version}:{digest}'
+    
     @action(detail=False, methods=['post'])
     def validate(self, request):
         """
@@ -190,69 +272,70 @@ class ReactionViewSet(viewsets.ReadOnlyModelViewSet):
     def find_reactions_for_elements(self, elements):
         """
         Busca reacciones que involucren los elementos dados.
-        Busca directamente en el campo JSON reactants.
+        Compara contra reactant_symbols (precalculado) directamente en SQL.
         """
-        all_reactions = Reaction.objects.all()
-        valid_reactions = []
-        partial_reactions = []
-        
-        for reaction in all_reactions:
-            # Obtener símbolos de la reacción
-            reaction_symbols = set()
-            for reactant in reaction.reactants:
-                if 'symbol' in reactant:
-                    reaction_symbols.add(reactant['symbol'])
-                if 'elements' in reactant:
-                    reaction_symbols.update(reactant['elements'])
-            
-            # Verificar si hay coincidencia con los elementos seleccionados
-            input_symbols = set(elements)
-            
-            # Coincidencia exacta: los elementos de entrada son exactamente los reactantes
-            if input_symbols == reaction_symbols:
-                valid_reactions.append(reaction)
-            # Coincidencia de subconjunto: los elementos de entrada están en la reacción
-            elif input_symbols.issubset(reaction_symbols):
-                partial_reactions.append(reaction)
-            # Para un solo elemento, buscar reacciones donde ese elemento participe
-            elif len(input_symbols) == 1 and input_symbols.intersection(reaction_symbols):
-                partial_reactions.append(reaction)
-        
-        # Retornar reacciones exactas primero, luego parciales
-        return valid_reactions if valid_reactions else partial_reactions[:5]
+        input_symbols = sorted(set(elements))
+        
+        # Todos los elementos de entrada están entre los reactantes
+        matches = (
+            self._annotate_symbol_matches(input_symbols)
+            .filter(match_count=len(input_symbols))
+        )
+        
+        # Coincidencia exacta: los elementos de entrada son exactamente los reactantes
+        exact = list(matches.filter(symbol_count=len(input_symbols))[:VALIDATE_MAX_RESULTS])
+        if exact:
+            return exact
+        
+        # Si no, las primeras reacciones que los contienen (subconjunto)
+        return list(matches[:5])
     
     def find_suggestions_for_elements(self, elements):
         """
         Busca reacciones que contengan AL MENOS UNO de los elementos dados.
-        Devuelve hasta 5 sugerencias ordenadas por relevancia.
+        Devuelve hasta 8 sugerencias ordenadas por relevancia.
         """
-        all_reactions = Reaction.objects.all()
-        suggestions = []
-        
-        for reaction in all_reactions:
-            reaction_symbols = set()
-            for reactant in reaction.reactants:
-                if 'symbol' in reactant:
-                    reaction_symbols.add(reactant['symbol'])
-                if 'elements' in reactant:
-                    reaction_symbols.update(reactant['elements'])
-            
-            # Contar cuántos elementos coinciden
-            input_symbols = set(elements)
-            matching = input_symbols.intersection(reaction_symbols)
-            
-            if matching:
-                suggestions.append({
-                    'reaction': reaction,
-                    'match_count': len(matching),
-                    'required_elements': list(reaction_symbols - input_symbols)
-                })
-        
-        # Ordenar por cantidad de coincidencias (más coincidencias primero)
-        suggestions.sort(key=lambda x: x['match_count'], reverse=True)
-        
-        # Retornar solo las reacciones
-        return [s['reaction'] for s in suggestions[:8]]
+        input_symbols = sorted(set(elements))
+        
+        # Más coincidencias primero; solo las columnas de ReactionListSerializer
+        return list(
+            self._annotate_symbol_matches(input_symbols)
+            .filter(match_count__gt=0)
+            .only(*ReactionListSerializer.Meta.fields)
+            .order_by('-match_count', *self._default_ordering())[:8]
+        )
+    
+    def _annotate_symbol_matches(self, symbols):
+        """
+        Anota match_count (cuántos de `symbols` están en reactant_symbols) y
+        symbol_count (tamaño de reactant_symbols), calculados en SQL con las
+        funciones JSON del motor (SQLite en desarrollo, PostgreSQL en producción).
+        """
+        queryset = self.get_queryset()
+        connection = connections[queryset.db]
+        try:
+            elements_sql, length_sql = SYMBOL_MATCH_SQL[connection.vendor]
+        except KeyError:
+            raise NotSupportedError(
+                f'Búsqueda por reactant_symbols no disponible en {connection.vendor}'
+            )
+        column = '.'.join(
+            connection.ops.quote_name(name)
+            for name in (Reaction._meta.db_table, 'reactant_symbols')
+        )
+        placeholders = ', '.join(['%s'] * len(symbols))
+        return queryset.annotate(
+            match_count=RawSQL(
+                f'SELECT COUNT(*) FROM {elements_sql.format(column=column)} '
+                f'WHERE symbol.value IN ({placeholders})',
+                symbols,
+            ),
+            symbol_count=RawSQL(length_sql.format(column=column), []),
+        ).order_by(*self._default_ordering())
+    
+    def _default_ordering(self):
+        # Orden del modelo con id como desempate, para resultados estables
+        return [*Reaction._meta.ordering, 'id']
     
     @action(detail=False, methods=['post'], throttle_classes=[AIRateThrottle])
     def explain(self, request):
@@ -260,33 +343,123 @@ class ReactionViewSet(viewsets.ReadOnlyModelViewSet):
         Genera explicación científica de una reacción usando DeepSeek.
         
         Request body: {"reaction_id": 1, "level": "intermediate"}
+        Con "background": true responde 202 con un job_id para consultar
+        en GET /api/reactions/jobs/{job_id}/.
+        Con {"reaction_ids": [1, 2, 3]} responde como explain_bulk.
         """
+        if 'reaction_ids' in request.data:
+            return self._bulk_explanation_response(request.data)
+        
         serializer = ExplanationRequestSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         
         reaction_id = serializer.validated_data['reaction_id']
         level = serializer.validated_data['level']
         
-        # Obtener reacción
-        reaction = Reaction.objects.get(id=reaction_id)
-        
-        # Llamar a DeepSeek
-        try:
-            ai_service = DeepSeekService()
-            explanation = ai_service.explain_reaction(reaction, level)
-            
+        if serializer.validated_data['background']:
+            job_id = jobs.submit_reaction_explanation(reaction_id, level)
             return Response({
                 'success': True,
+                'job_id': job_id,
+                'status': jobs.JOB_STATUS_PENDING,
                 'reaction_id': reaction_id,
-                'level': level,
-                'explanation': explanation
-            })
-        except Exception as e:
-            return Response({
-                'success': False,
-                'error': f'Error al generar explicación: {str(e)}',
-                'fallback_description': reaction.description
-            }, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+                'level': level
+            }, status=status.HTTP_202_ACCEPTED)
+        
+        reaction = serializer.validated_data['reaction']
+        
+        # Llamar a DeepSeek (el servicio ya recurre al fallback local)
+        explanation, source = DeepSeekService().explain_reaction(reaction, level)
+        return Response({
+            'success': True,
+            'reaction_id': reaction_id,
+            'level': level,
+            'explanation': explanation,
+            'source': source
+        })
+    
+    @action(detail=False, methods=['post'], throttle_classes=[AIRateThrottle])
+    def explain_bulk(self, request):
+        """
+        Explica varias reacciones agrupándolas en pocos prompts a Ollama.
+        
+        Request body: {"reaction_ids": [1, 2, 3], "level": "basic"}
+        """
+        return self._bulk_explanation_response(request.data)
+    
+    def _bulk_explanation_response(self, data):
+        serializer = BulkExplanationRequestSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        
+        reactions = serializer.validated_data['reactions']
+        level = serializer.validated_data['level']
+        
+        explanations = DeepSeekService().explain_reactions_bulk(reactions, level)
+        
+        return Response({
+            'success': True,
+            'level': level,
+            'explanations': [
+                {'reaction_id': r.id, 'explanation': text}
+                for r, text in zip(reactions, explanations)
+            ]
+        })
+    
+    @action(detail=False, methods=['get'], url_path=r'jobs/(?P<job_id>[0-9a-f]{32})')
+    def job_status(self, request, job_id=None):
+        """Estado de una explicación encolada con "background": true."""
+        job = jobs.get_job(job_id)
+        if job is None:
+            return Response(
+                {'error': 'Trabajo no encontrado o expirado'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({'job_id': job_id, **job})
+    
+    @action(detail=True, methods=['get'], throttle_classes=[AIRateThrottle],
+            renderer_classes=[ORJSONRenderer, EventStreamRenderer])
+    def explain_stream(self, request, pk=None):
+        """
+        Transmite la explicación de una reacción token a token (text/event-stream).
+        
+        Cada evento es `data: {"token": "..."}` (sin el bloque de pensamiento
+        inicial del modelo); al terminar se envía el texto limpio completo
+        como `data: {"final": "..."}` y después `data: [DONE]`. Si la
+        explicación ya está en caché solo se envía el evento final.
+        """
+        serializer = ExplanationRequestSerializer(data={
+            'reaction_id': pk,
+            'level': request.query_params.get('level', 'intermediate'),
+        })
+        serializer.is_valid(raise_exception=True)
+        
+        level = serializer.validated_data['level']
+        reaction = serializer.validated_data['reaction']
+        ai_service = DeepSeekService()
+        
+        def sse(payload):
+            return b"data: " + orjson.dumps(payload) + b"\n\n"
+        
+        def event_stream():
+            parts = []
+            try:
+                # Ya generada (o generándose en este proceso): un único evento final
+                cached = ai_service.cached_reaction_explanation(reaction, level)
+                if cached is not None:
+                    yield sse({'final': cached[0]})
+                else:
+                    for token in ai_service.explain_reaction_stream(reaction, level):
+                        parts.append(token)
+                        yield sse({'token': token})
+                    yield sse({'final': ai_service.clean_response(''.join(parts))})
+            except AI_SERVICE_ERRORS as e:
+                yield sse({'error': f'Error al generar explicación: {e}'})
+            yield b"data: [DONE]\n\n"
+        
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'  # Evitar buffering en proxies (nginx)
+        return response
     
     @action(detail=False, methods=['get'])
     def by_type(self, request):
@@ -298,6 +471,10 @@ class ReactionViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        reactions = self.queryset.filter(reaction_type=reaction_type)
-        serializer = ReactionListSerializer(reactions, many=True)
-        return Response({'reactions': serializer.data})
+        return _cached_json_response(
+            request, self._list_cache_key('by_type', {'type': reaction_type}),
+            lambda: ORJSONRenderer().render({
+                'reactions': self._list_rows(self.queryset.filter(reaction_type=reaction_type))
+            }),
+            REACTION_LIST_CACHE_TIMEOUT
+        )
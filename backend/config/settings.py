@@ -40,6 +40,10 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Must be first
     'django.middleware.security.SecurityMiddleware',
+    # ETag + 304 (If-None-Match) en las respuestas GET no streaming. Compara
+    # después de ejecutar la vista: solo ahorra ancho de banda. Las vistas con
+    # _cached_json_response (api.views) ya responden 304 sin consultar la BD.
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -74,6 +78,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Conexiones persistentes: cada worker reutiliza su conexión entre
+        # peticiones en lugar de abrirla y cerrarla en cada una.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '600')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
@@ -101,6 +109,36 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# ============================================
+# Cache (explicaciones IA, trabajos en segundo plano, listados)
+# ============================================
+# Con varios procesos (gunicorn -w N, etc.) la caché tiene que ser
+# compartida: definir REDIS_URL (requiere `pip install redis`). Sin ella se
+# usa una caché en memoria propia de cada proceso, válida solo con un único
+# proceso como `manage.py runserver` (ver README).
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'reacciones-quimicas',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'reacciones-quimicas',
+            'OPTIONS': {
+                # 118 elementos y las reacciones × 3 niveles caben con holgura
+                'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '2000')),
+            },
+        }
+    }
+
+
 # ============================================
 # CORS Configuration (for frontend connection)
 # ============================================
@@ -117,7 +155,7 @@ CORS_ALLOW_CREDENTIALS = True
 # ============================================
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'api.renderers.ORJSONRenderer',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
         'rest_framework.throttling.AnonRateThrottle',
@@ -135,3 +173,15 @@ REST_FRAMEWORK = {
 # ============================================
 OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
 OLLAMA_MODEL = os.environ.get('OLLAMA_MODEL', 'llama3.2:latest')
+# Ventana de contexto por defecto y máxima (tokens). Para atender varias
+# peticiones a la vez, arrancar Ollama con OLLAMA_NUM_PARALLEL (ver README).
+OLLAMA_NUM_CTX = int(os.environ.get('OLLAMA_NUM_CTX', '2048'))
+OLLAMA_NUM_CTX_CAP = int(os.environ.get('OLLAMA_NUM_CTX_CAP', '8192'))
+# Hilos para explicaciones en segundo plano ("background": true)
+AI_JOB_WORKERS = int(os.environ.get('AI_JOB_WORKERS', '4'))
+# El estado de esos trabajos vive en la caché: con una caché por proceso
+# solo se aceptan si el servidor corre en un único proceso (por defecto,
+# solo con DEBUG, es decir, runserver)
+AI_JOBS_ALLOW_LOCAL_CACHE = os.environ.get(
+    'AI_JOBS_ALLOW_LOCAL_CACHE', str(DEBUG)
+).lower() == 'true'
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-14 19:07
+
+from django.db import migrations, models
+
+
+def fill_electron_shells(apps, schema_editor):
+    # Misma fórmula que Element.get_electron_shells (el modelo histórico no tiene métodos)
+    Element = apps.get_model('elements', 'Element')
+    elements = list(Element.objects.only('id', 'electrons_per_shell'))
+    for element in elements:
+        element.electron_shells = [
+            {'shell': i, 'electrons': count, 'radius': 1.0 + (i * 0.8)}
+            for i, count in enumerate(element.electrons_per_shell, start=1)
+        ]
+    Element.objects.bulk_update(elements, ['electron_shells'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elements', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='element',
+            name='electron_shells',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+        migrations.RunPython(fill_electron_shells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-14 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('elements', '0002_element_electron_shells'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='element',
+            index=models.Index(fields=['category', 'atomic_number'], name='element_category_number_idx'),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.core.cache import cache
 from django.db import models
 
 
@@ -33,6 +34,8 @@ class Element(models.Model):
     # Configuración electrónica
     electron_config = models.CharField(max_length=100)
     electrons_per_shell = models.JSONField(default=list)  # [2, 8, 1] para Na
+    # get_electron_shells() precalculado en pre_save (ver elements.signals)
+    electron_shells = models.JSONField(default=list, blank=True, editable=False)
     valence_electrons = models.IntegerField(default=0)
     
     # Propiedades químicas
@@ -54,6 +57,10 @@ class Element(models.Model):
     
     class Meta:
         ordering = ['atomic_number']
+        # Filtro por categoría ya en el orden por defecto (sin ordenar aparte)
+        indexes = [
+            models.Index(fields=['category', 'atomic_number'], name='element_category_number_idx'),
+        ]
         verbose_name = 'Elemento'
         verbose_name_plural = 'Elementos'
     
@@ -70,3 +77,45 @@ class Element(models.Model):
                 'radius': 1.0 + (i * 0.8)  # Radio orbital para Three.js
             })
         return shells
+
+
+# Los 118 símbolos viven en la caché de Django como ({minúsculas: símbolo},
+# frozenset de símbolos), una sola entrada para que ambos se construyan e
+# invaliden juntos y todos los procesos compartan los cambios:
+# elements.signals borra la clave al guardar/borrar un Element, y el timeout
+# acota cuánto tarda en notarse un cambio hecho en otro proceso o con
+# QuerySet.update().
+SYMBOLS_CACHE_KEY = 'elements:symbols:v2'
+SYMBOLS_CACHE_TIMEOUT = 300  # 5 minutos
+
+
+def _symbol_tables():
+    tables = cache.get(SYMBOLS_CACHE_KEY)
+    if tables is None:
+        symbols = list(Element.objects.values_list('symbol', flat=True))
+        tables = ({s.lower(): s for s in symbols}, frozenset(symbols))
+        cache.set(SYMBOLS_CACHE_KEY, tables, SYMBOLS_CACHE_TIMEOUT)
+    return tables
+
+
+def get_valid_symbols():
+    """frozenset con los símbolos de todos los elementos."""
+    return _symbol_tables()[1]
+
+
+def canonical_symbol(symbol):
+    """
+    Símbolo con su capitalización real ('fe' -> 'Fe'), o None si no está
+    en la caché. Permite buscar con symbol=... (índice único) en lugar de
+    symbol__iexact.
+    """
+    return _symbol_tables()[0].get(symbol.lower())
+
+
+def clear_valid_symbols():
+    cache.delete(SYMBOLS_CACHE_KEY)
+
+
+# (ETag, JSON ya renderizado) de /api/elements/periodic_table/ (ver ElementViewSet)
+PERIODIC_TABLE_CACHE_KEY = 'elements:periodic_table:v2'
+PERIODIC_TABLE_CACHE_TIMEOUT = 3600  # 1 hora (30 s sin caché compartida)
@@ -0,0 +1,18 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Element, PERIODIC_TABLE_CACHE_KEY, clear_valid_symbols
+
+
+@receiver(pre_save, sender=Element)
+def fill_electron_shells(sender, instance, **kwargs):
+    # También se ejecuta con loaddata (raw=True)
+    instance.electron_shells = instance.get_electron_shells()
+
+
+@receiver(post_save, sender=Element)
+@receiver(post_delete, sender=Element)
+def invalidate_valid_symbols(sender, **kwargs):
+    clear_valid_symbols()
+    cache.delete(PERIODIC_TABLE_CACHE_KEY)
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-14 19:03
+
+from django.db import migrations, models
+
+
+def describe_species(species, keys):
+    # Copia de reactions.models.describe_species en el momento de esta
+    # migración: una migración histórica no debe depender del código actual
+    names = []
+    for item in species or ():
+        name = next((item.get(k) for k in keys if item.get(k)), None)
+        if name:
+            names.append(name)
+    return ' y '.join(names)[:500]
+
+
+def fill_display_fields(apps, schema_editor):
+    Reaction = apps.get_model('reactions', 'Reaction')
+    reactions = list(Reaction.objects.only('id', 'reactants', 'products'))
+    for reaction in reactions:
+        reaction.reactants_display = describe_species(reaction.reactants, ('symbol', 'formula'))
+        reaction.products_display = describe_species(reaction.products, ('name', 'formula'))
+    Reaction.objects.bulk_update(reactions, ['reactants_display', 'products_display'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reactions', '0002_alter_reaction_created_at_alter_reaction_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reaction',
+            name='products_display',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.AddField(
+            model_name='reaction',
+            name='reactants_display',
+            field=models.CharField(blank=True, default='', max_length=500),
+        ),
+        migrations.RunPython(fill_display_fields, migrations.RunPython.noop),
+    ]
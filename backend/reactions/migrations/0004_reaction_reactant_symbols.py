@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-14 19:05
+
+from django.db import migrations, models
+
+
+def collect_reactant_symbols(reactants):
+    # Copia de reactions.models.collect_reactant_symbols en el momento de
+    # esta migración: una migración histórica no debe depender del código actual
+    symbols = set()
+    for reactant in reactants or ():
+        if 'symbol' in reactant:
+            symbols.add(reactant['symbol'])
+        if 'elements' in reactant:
+            symbols.update(reactant['elements'])
+    return sorted(symbols)
+
+
+def fill_reactant_symbols(apps, schema_editor):
+    Reaction = apps.get_model('reactions', 'Reaction')
+    reactions = list(Reaction.objects.only('id', 'reactants'))
+    for reaction in reactions:
+        reaction.reactant_symbols = collect_reactant_symbols(reaction.reactants)
+    Reaction.objects.bulk_update(reactions, ['reactant_symbols'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reactions', '0003_reaction_display_fields'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reaction',
+            name='reactant_symbols',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.RunPython(fill_reactant_symbols, migrations.RunPython.noop),
+    ]
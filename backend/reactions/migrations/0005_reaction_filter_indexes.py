@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-14 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reactions', '0004_reaction_reactant_symbols'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['difficulty_level', 'reaction_type'], name='reaction_level_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['reaction_type', 'difficulty_level'], name='reaction_type_level_idx'),
+        ),
+    ]
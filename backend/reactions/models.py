@@ -2,6 +2,27 @@ from django.db import models
 from elements.models import Element
 
 
+def describe_species(species, keys):
+    """Une con ' y ' el primer valor no vacío de `keys` de cada reactivo/producto."""
+    names = []
+    for item in species or ():
+        name = next((item.get(k) for k in keys if item.get(k)), None)
+        if name:
+            names.append(name)
+    return ' y '.join(names)[:500]
+
+
+def collect_reactant_symbols(reactants):
+    """Símbolos de elementos de los reactivos ('symbol' y/o lista 'elements'), ordenados."""
+    symbols = set()
+    for reactant in reactants or ():
+        if 'symbol' in reactant:
+            symbols.add(reactant['symbol'])
+        if 'elements' in reactant:
+            symbols.update(reactant['elements'])
+    return sorted(symbols)
+
+
 class Reaction(models.Model):
     """
     Modelo para reacciones químicas validadas.
@@ -40,6 +61,12 @@ class Reaction(models.Model):
     products = models.JSONField()
     # Ejemplo: [{"formula": "NaCl", "count": 2, "state": "s", "name": "Cloruro de sodio"}]
     
+    # Campos derivados de reactants/products, rellenados en pre_save (también
+    # con loaddata); ver fill_derived_fields
+    reactants_display = models.CharField(max_length=500, blank=True, default='')  # "Na y Cl2"
+    products_display = models.CharField(max_length=500, blank=True, default='')
+    reactant_symbols = models.JSONField(default=list, blank=True)  # ["Cl", "Na"]
+    
     # Condiciones de reacción
     conditions = models.JSONField(default=dict)
     # Ejemplo: {"temperature": 25, "pressure": 1, "catalyst": null, "requires_heat": false}
@@ -70,21 +97,27 @@ class Reaction(models.Model):
     
     class Meta:
         ordering = ['difficulty_level', 'reaction_type']
+        # Filtros de list/by_type ya en el orden por defecto (sin ordenar aparte)
+        indexes = [
+            models.Index(fields=['difficulty_level', 'reaction_type'], name='reaction_level_type_idx'),
+            models.Index(fields=['reaction_type', 'difficulty_level'], name='reaction_type_level_idx'),
+        ]
         verbose_name = 'Reacción'
         verbose_name_plural = 'Reacciones'
     
     def __str__(self):
         return self.equation
     
+    def fill_derived_fields(self):
+        """Recalcula los campos derivados de reactants/products."""
+        self.reactants_display = describe_species(self.reactants, ('symbol', 'formula'))
+        self.products_display = describe_species(self.products, ('name', 'formula'))
+        self.reactant_symbols = collect_reactant_symbols(self.reactants)
+    
     def get_element_symbols(self):
         """Retorna lista de símbolos de elementos involucrados."""
-        symbols = set()
-        for reactant in self.reactants:
-            if 'symbol' in reactant:
-                symbols.add(reactant['symbol'])
-            elif 'elements' in reactant:
-                symbols.update(reactant['elements'])
-        return list(symbols)
+        # reactant_symbols se rellena en pre_save; sin guardar, se calcula
+        return list(self.reactant_symbols or collect_reactant_symbols(self.reactants))
 
 
 class ReactionElement(models.Model):
@@ -106,3 +139,10 @@ class ReactionElement(models.Model):
     
     class Meta:
         unique_together = ['reaction', 'element', 'role']
+
+
+# Respuestas de /api/reactions/ y by_type cacheadas como (ETag, JSON); la
+# versión forma parte de la clave y reactions.signals la renueva al
+# guardar/borrar una Reaction, así las entradas viejas dejan de usarse.
+REACTION_LIST_CACHE_VERSION_KEY = 'reactions:list:version'
+REACTION_LIST_CACHE_TIMEOUT = 300  # 5 minutos (30 s sin caché compartida)
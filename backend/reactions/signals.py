@@ -0,0 +1,20 @@
+import time
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Reaction, REACTION_LIST_CACHE_VERSION_KEY
+
+
+@receiver(pre_save, sender=Reaction)
+def fill_reaction_derived_fields(sender, instance, **kwargs):
+    # También se ejecuta con loaddata (raw=True), a diferencia de save()
+    instance.fill_derived_fields()
+
+
+@receiver(post_save, sender=Reaction)
+@receiver(post_delete, sender=Reaction)
+def invalidate_reaction_lists(sender, **kwargs):
+    # Versión nueva (no incr): si la clave se pierde, no puede repetirse
+    cache.set(REACTION_LIST_CACHE_VERSION_KEY, time.time_ns(), None)